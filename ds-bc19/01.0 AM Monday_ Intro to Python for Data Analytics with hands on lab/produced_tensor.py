@@ -0,0 +1,191 @@
+
+#####################################################################################################################
+#
+# A sparse version of the produced [doc, topic, word] tensor of Day 1 AM Lab 3.
+#
+# Lab 3 keeps produced = np.zeros ((50, 100, 2000)), 80MB of float64 for 50 documents, and almost all of it is
+# zero: a document has only 1000 words, which come from a handful of topics.  At 100,000 documents that would
+# be 160GB.  A ProducedTensor keeps just the non-zero entries, as (topic, word, count) triples sorted by
+# document, with the entries of document d at positions indptr[d] to indptr[d + 1] (the CSR layout, with one
+# row per document), and it keeps two marginals up to date as the entries come in:
+#
+# docTopic[doc, topic], the number of words of each document that came from each topic, which is
+#     produced.sum (2), and
+# topicWord[topic, word], the number of times that each topic produced each word over the whole corpus,
+#     which is produced.sum (0)
+#
+# It is filled in and queried with the same code as the dense array: the lab's
+#
+# produced[doc, topic] = np.random.multinomial (wordsToTopic[topic], wordsInTopic[topic])
+#
+# works as it is, and so do all of the queries of the lab, such as produced[18, 17:46].sum (),
+# produced[:, np.arange (0, 100, 2), :].sum (), produced.sum (0).argmax (0) or
+# produced[:, np.arange (0, 100), produced.sum (0).argmax (1)].sum (0).  Indexing gives back a lazy view, and
+# a sum that runs over all of the words (or all of the documents) of the view is answered straight from
+# docTopic (or topicWord), so that it costs one lookup per (document, topic) or (topic, word) that is
+# selected, no matter how many documents there are.  Anything else is answered by building the dense
+# version of just the documents that the view selects, from their entries.
+#
+#####################################################################################################################
+
+import numpy as np
+
+class ProducedTensor:
+        #
+        # this is an empty tensor, where every entry is zero
+        def __init__ (self, numDocs, numTopics, numWords):
+                self.shape = (numDocs, numTopics, numWords)
+                self.ndim = 3
+                self.docTopic = np.zeros ((numDocs, numTopics), dtype=np.int64)
+                self.topicWord = np.zeros ((numTopics, numWords), dtype=np.int64)
+                self.pending = []
+                self.indptr = np.zeros (numDocs + 1, dtype=np.int64)
+                self.topics = np.zeros (0, dtype=np.int32)
+                self.words = np.zeros (0, dtype=np.int32)
+                self.counts = np.zeros (0, dtype=np.int64)
+
+        # this sets produced[doc, topic] to the given vector of counts, one per word, just like the dense
+        # array.  The marginals only ever add up, so a (doc, topic) pair that already holds some words cannot be
+        # set again
+        def __setitem__ (self, key, wordCounts):
+                doc, topic = key
+                wordCounts = np.asarray (wordCounts)
+                if wordCounts.shape != (self.shape[2],):
+                        raise ValueError ("produced[doc, topic] has to be set to %d counts, but got an array of shape %r" % (self.shape[2], wordCounts.shape))
+                if self.docTopic[doc, topic] != 0:
+                        raise ValueError ("produced[%d, %d] has already been set" % (doc, topic))
+                words = np.flatnonzero (wordCounts).astype (np.int32)
+                self.pending.append ((doc, topic, words, wordCounts[words].astype (np.int64)))
+                self.docTopic[doc, topic] = self.docTopic[doc, topic] + np.sum (wordCounts)
+                self.topicWord[topic] = self.topicWord[topic] + wordCounts
+
+        # this merges the entries that were set since the last query into the sorted entries
+        def consolidate (self):
+                if len (self.pending) == 0:
+                        return
+                docs = np.concatenate ([np.repeat (np.arange (self.shape[0]), np.diff (self.indptr))] + [np.full (len (x[2]), x[0] % self.shape[0]) for x in self.pending])
+                topics = np.concatenate ([self.topics] + [np.full (len (x[2]), x[1], dtype=np.int32) for x in self.pending])
+                words = np.concatenate ([self.words] + [x[2] for x in self.pending])
+                counts = np.concatenate ([self.counts] + [x[3] for x in self.pending])
+                order = np.lexsort ((words, topics, docs))
+                self.topics, self.words, self.counts = topics[order], words[order], counts[order]
+                self.indptr = np.concatenate (([0], np.cumsum (np.bincount (docs, minlength=self.shape[0]))))
+                self.pending = []
+
+        # this returns the dense (len (docs), numTopics, numWords) version of the given documents
+        def denseDocs (self, docs):
+                self.consolidate ()
+                returnVal = np.zeros ((len (docs),) + self.shape[1:], dtype=np.int64)
+                for i, doc in enumerate (docs):
+                        start, end = self.indptr[doc], self.indptr[doc + 1]
+                        returnVal[i, self.topics[start:end], self.words[start:end]] = self.counts[start:end]
+                return returnVal
+
+        def __getitem__ (self, key):
+                return ProducedView (self, key)
+
+        # this sums over the given axes, just like np.sum on the dense array... every sum that runs over the
+        # documents or over the words comes straight out of the marginals
+        def sum (self, axis=None):
+                axes = None if axis is None else tuple (sorted (x % 3 for x in np.atleast_1d (axis)))
+                if axes is None:
+                        return int (np.sum (self.docTopic))
+                if axes == (0,):
+                        return self.topicWord.copy ()
+                if axes == (2,):
+                        return self.docTopic.copy ()
+                if axes == (0, 2):
+                        return np.sum (self.topicWord, axis=1)
+                if axes == (1, 2):
+                        return np.sum (self.docTopic, axis=1)
+                if axes == (0, 1):
+                        return np.sum (self.topicWord, axis=0)
+                if axes == (0, 1, 2):
+                        return int (np.sum (self.docTopic))
+                #
+                # produced.sum (1) is the (numDocs, numWords) count of every word in every document
+                self.consolidate ()
+                returnVal = np.zeros ((self.shape[0], self.shape[2]), dtype=np.int64)
+                np.add.at (returnVal, (np.repeat (np.arange (self.shape[0]), np.diff (self.indptr)), self.words), self.counts)
+                return returnVal
+
+        # and this is the whole dense array, for small tensors
+        def toDense (self):
+                return self.denseDocs (np.arange (self.shape[0]))
+
+        def __array__ (self, dtype=None, copy=None):
+                return self.toDense () if dtype is None else self.toDense ().astype (dtype)
+
+# this is produced[key], for any key that numpy accepts for a 3-dimensional array, without building it
+class ProducedView:
+        #
+        def __init__ (self, tensor, key):
+                key = key if isinstance (key, tuple) else (key,)
+                if any (x is Ellipsis for x in key):
+                        i = [x is Ellipsis for x in key].index (True)
+                        key = key[:i] + (slice (None),) * (3 - len (key) + 1) + key[i + 1:]
+                self.tensor = tensor
+                self.key = key + (slice (None),) * (3 - len (key))
+                self.shape = self.resultShape ()
+                self.ndim = len (self.shape)
+
+        # this works out the shape of the result without building it, the way numpy does: integers drop their
+        # axis and slices keep theirs, unless there are also arrays in the key, in which case the integers and
+        # arrays are all broadcast together, and their shape goes where they are in the key if they are next
+        # to each other, and at the front otherwise
+        def resultShape (self):
+                basic, advanced, positions = [], [], []
+                for i, (x, size) in enumerate (zip (self.key, self.tensor.shape)):
+                        if isinstance (x, slice):
+                                basic.append ((i, len (range (*x.indices (size)))))
+                        elif np.asarray (x).dtype == bool:
+                                advanced.append ((np.count_nonzero (x),))
+                                positions.append (i)
+                        else:
+                                advanced.append (np.shape (x))
+                                positions.append (i)
+                if all (len (x) == 0 for x in advanced):
+                        return tuple (x[1] for x in basic)
+                broadcast = np.broadcast_shapes (*advanced)
+                if positions[-1] - positions[0] == len (positions) - 1:
+                        return tuple (x[1] for x in basic if x[0] < positions[0]) + broadcast + tuple (x[1] for x in basic if x[0] > positions[0])
+                return broadcast + tuple (x[1] for x in basic)
+
+        def isFull (self, i):
+                return isinstance (self.key[i], slice) and self.key[i] == slice (None)
+
+        # this builds the dense version of the view, from the entries of just the documents that it selects
+        def toDense (self):
+                docKey = self.key[0]
+                if isinstance (docKey, slice):
+                        docs, docKey = np.arange (self.tensor.shape[0])[docKey], slice (None)
+                elif np.ndim (docKey) == 0:
+                        docs, docKey = np.array ([docKey % self.tensor.shape[0]]), 0
+                else:
+                        positions = np.asarray (docKey)
+                        if positions.dtype == bool:
+                                positions = np.flatnonzero (positions)
+                        docs, docKey = np.unique (positions % self.tensor.shape[0], return_inverse=True)
+                        docKey = docKey.reshape (positions.shape)
+                return self.tensor.denseDocs (docs)[(docKey,) + tuple (self.key[1:])]
+
+        # this sums over the given axes of the view, just like np.sum on the dense version of it
+        def sum (self, axis=None):
+                wordsFull, docsFull = self.isFull (2), self.isFull (0)
+                axes = tuple (range (self.ndim)) if axis is None else tuple (sorted (x % self.ndim for x in np.atleast_1d (axis)))
+                #
+                # summing away the words of a view that keeps all of them (the last axis of the view), or all
+                # of its documents (the first axis), is just the same selection from docTopic or topicWord
+                if wordsFull and self.ndim - 1 in axes:
+                        return np.sum (self.tensor.docTopic[self.key[:2]], axis=self.remaining (axes, self.ndim - 1))
+                if docsFull and 0 in axes:
+                        return np.sum (self.tensor.topicWord[self.key[1:]], axis=self.remaining (axes, 0))
+                return np.sum (self.toDense (), axis=axis)
+
+        # this drops the given axis from a tuple of axes, and renumbers the ones after it
+        def remaining (self, axes, dropped):
+                returnVal = tuple (x - (x > dropped) for x in axes if x != dropped)
+                return None if len (returnVal) == self.ndim - 1 else returnVal
+
+        def __array__ (self, dtype=None, copy=None):
+                return self.toDense () if dtype is None else self.toDense ().astype (dtype)
@@ -5,6 +5,7 @@ Spyder Editor
 This is a temporary script file.
 """
 import numpy as np
+from topic_corpus import generateCorpus
 
 # this returns a number whose probability of occurence is p
 def sampleValue (p):
@@ -48,4 +49,20 @@ for doc in range (0, 50):
                 #
         # now, remember this document
         wordsInCorpus [doc] = wordsInDoc
-        
\ No newline at end of file
+
+# the loop above makes two tiny np.random.multinomial calls for every single word, which is far too slow to
+# generate the millions of documents of a load-test corpus.  generateCorpus (see topic_corpus.py) draws the
+# same kind of corpus from the same wordsInTopic and beta with a handful of vectorized calls per block of
+# documents, and returns the counts directly: countsInCorpus[doc, word] is the number of times that the
+# word occurs in the document, like wordsInCorpus[doc].get (word, 0) above
+countsInCorpus = generateCorpus (wordsInTopic, beta, 50, 1000, dense=True)
+
+# and without dense=True it returns the (indptr, indices, counts) arrays of a sparse CSR matrix instead, which
+# is the way to get a big corpus, since the words of document i are indices[indptr[i]:indptr[i + 1]], and
+# their counts are counts[indptr[i]:indptr[i + 1]]; for example, for 100,000 documents,
+# indptr, indices, counts = generateCorpus (wordsInTopic, beta, 100000, 1000, rng=np.random.default_rng (0))
+
+# to write a much bigger corpus to disk, in parallel, use generateShards instead; for example,
+# generateShards ("syntheticCorpus", wordsInTopic, beta, 100000, 1000, seed=330, format="text")
+# writes 100 million words as ten files in the one-line-per-document format of 20_news_same_line.txt, which
+# the Activity scripts can read in place of the real corpus, and gives the very same files for the same seed
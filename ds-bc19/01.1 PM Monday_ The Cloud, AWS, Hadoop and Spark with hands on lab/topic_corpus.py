@@ -0,0 +1,201 @@
+
+#####################################################################################################################
+#
+# Vectorized generation of synthetic topic-model corpora, like the one of day1am_lab1.py.
+#
+# day1am_lab1.py draws every single word with two calls to sampleValue, each of which makes a fresh
+# np.random.multinomial (1, p, 1) and an np.flatnonzero, and keeps the counts in Python dictionaries; that
+# is fine for 50 documents, but hopeless for the millions of documents of a load-test corpus.  generateCorpus
+# draws the same corpus a block of documents at a time, with a handful of numpy calls per block:
+#
+# 1. the topic probabilities of every document in the block, with one call to dirichlet
+# 2. how many of the words of each document come from each topic, with one call to multinomial
+# 3. every one of those words, with the alias method: the probabilities of the words of each topic are
+#    turned into an alias table once, and then each word costs one uniform number and two table lookups,
+#    done for all of the words in the block that come from the same topic at once
+#
+# and then adds up the words of each document into counts, with one bincount per block, either as a dense
+# (numDocs, numWords) matrix, or as the (indptr, indices, counts) arrays of a CSR matrix, where the counts of
+# document i are counts[j] for the words indices[j], with j from indptr[i] to indptr[i + 1].  For example:
+#
+# wordsInTopic = np.random.dirichlet (np.full (2000, .1), 100)
+# indptr, indices, counts = generateCorpus (wordsInTopic, np.full (100, .1), 1000000, 1000, rng=np.random.default_rng (0))
+#
+# For corpora too big for one process (or for memory), generateShards splits the documents into shards of
+# docsPerShard documents, generates them in a pool of processes, and writes each shard to its own file as
+# soon as it is done, either as a CSR matrix in an .npz file, or as text in the same one-line-per-document
+# format as 20_news_same_line.txt, which the Activity scripts can read as they are (just as with the real
+# corpus, their tokenizer also reads the closing </doc> tag as one extra "doc" word in every document, on
+# top of the generated counts).  Every shard draws from its own child of np.random.SeedSequence (seed), from
+# SeedSequence.spawn, so the streams of the shards are independent, and a corpus only depends on the seed and
+# docsPerShard, never on the number of processes or on the order that the shards finish in.  For example,
+# this writes a corpus of 100 million words:
+#
+# generateShards ("corpus", wordsInTopic, np.full (100, .1), 100000, 1000, seed=330, format="text")
+#
+#####################################################################################################################
+
+import os
+import multiprocessing
+import numpy as np
+
+# this returns the alias tables (probability, alias) of the words in each topic, one row per topic.  To
+# draw a word from topic t, pick a slot i uniformly from 0 to numWords - 1, and take word i with probability
+# probability[t, i], and word alias[t, i] otherwise.  The tables are built with Vose's method: every slot
+# holds 1 / numWords of probability, split between its own word and at most one other
+def aliasTables (wordsInTopic):
+        numTopics, numWords = wordsInTopic.shape
+        probability = np.ones ((numTopics, numWords))
+        alias = np.tile (np.arange (numWords, dtype=np.int32), (numTopics, 1))
+        for topic in range (numTopics):
+                scaled = wordsInTopic[topic] * numWords / np.sum (wordsInTopic[topic])
+                small, large = list (np.flatnonzero (scaled < 1.0)), list (np.flatnonzero (scaled >= 1.0))
+                while len (small) > 0 and len (large) > 0:
+                        less, more = small.pop (), large.pop ()
+                        probability[topic, less], alias[topic, less] = scaled[less], more
+                        scaled[more] = scaled[more] - (1.0 - scaled[less])
+                        (small if scaled[more] < 1.0 else large).append (more)
+        return probability, alias
+
+# this draws the words of a block of documents, given the topic probabilities of each of them (one row per
+# document), and returns (docs, topics, words) arrays with one entry per word: the document (in the block)
+# that the word is in, the topic that produced it, and the word itself.  The words come out grouped by
+# topic, so that all of the words of one topic are drawn together from its alias table
+def sampleTokens (rng, topicsInDocs, tables, wordsPerDoc):
+        probability, alias = tables
+        numDocs, numTopics = topicsInDocs.shape
+        wordsToTopic = rng.multinomial (wordsPerDoc, topicsInDocs)
+        pairs = np.repeat (np.arange (numTopics * numDocs), wordsToTopic.T.ravel ())
+        topics, docs = np.divmod (pairs, numDocs)
+        #
+        # one uniform number in [0, numWords) per word: its integer part is the slot, and its fraction decides
+        # between the word of the slot and its alias
+        uniform = rng.random (len (pairs)) * probability.shape[1]
+        slots = uniform.astype (np.int32)
+        words = np.empty (len (pairs), dtype=np.int32)
+        ends = np.cumsum (wordsToTopic.sum (0))
+        for topic, start, end in zip (range (numTopics), ends - wordsToTopic.sum (0), ends):
+                slot = slots[start:end]
+                words[start:end] = np.where (uniform[start:end] - slot < probability[topic, slot], slot, alias[topic, slot])
+        return docs, topics, words
+
+# this generates numDocs documents of wordsPerDoc words each (a number, or an array with one entry per
+# document), blockSize documents at a time, and yields (topicsInDocs, docs, indices, counts) for each block:
+# the topic proportions of its documents, one row each, and the (document, word, count) of every word that
+# occurs in them, sorted by document, where the documents are numbered from 0 within the block
+def generateBlocks (tables, beta, numDocs, wordsPerDoc, rng, blockSize):
+        numWords = tables[0].shape[1]
+        wordsPerDoc = np.broadcast_to (wordsPerDoc, numDocs)
+        for start in range (0, numDocs, blockSize):
+                end = min (start + blockSize, numDocs)
+                topicsInDocs = rng.dirichlet (beta, end - start)
+                docs, topics, words = sampleTokens (rng, topicsInDocs, tables, wordsPerDoc[start:end])
+                counts = np.bincount (docs * numWords + words, minlength=(end - start) * numWords)
+                keys = np.flatnonzero (counts)
+                yield topicsInDocs, keys // numWords, (keys % numWords).astype (np.int32), counts[keys].astype (np.int32)
+
+# this generates numDocs documents from the topics in wordsInTopic, with topic proportions drawn from a
+# Dirichlet (beta), and returns the counts of the words in the documents as described above
+def generateCorpus (wordsInTopic, beta, numDocs, wordsPerDoc=1000, rng=None, blockSize=4096, dense=False):
+        rng = np.random.default_rng () if rng is None else rng
+        numWords = wordsInTopic.shape[1]
+        if dense:
+                returnVal = np.zeros ((numDocs, numWords), dtype=np.int64)
+        blocks, start = [], 0
+        for topicsInDocs, docs, indices, counts in generateBlocks (aliasTables (wordsInTopic), beta, numDocs, wordsPerDoc, rng, blockSize):
+                if dense:
+                        returnVal[docs + start, indices] = counts
+                else:
+                        blocks.append ((docs + start, indices, counts))
+                start = start + len (topicsInDocs)
+        if dense:
+                return returnVal
+        return stackBlocks (blocks, numDocs)
+
+# this puts the (docs, indices, counts) of a list of blocks together into the (indptr, indices, counts) arrays
+# of a CSR matrix with numDocs rows
+def stackBlocks (blocks, numDocs):
+        if len (blocks) == 0:
+                return (np.zeros (numDocs + 1, dtype=np.int64), np.zeros (0, dtype=np.int32), np.zeros (0, dtype=np.int32))
+        docs, indices, counts = [np.concatenate (x) for x in zip (*blocks)]
+        indptr = np.concatenate (([0], np.cumsum (np.bincount (docs, minlength=numDocs))))
+        return (indptr, indices, counts)
+
+#####################################################################################################################
+#
+# Sharded, parallel generation straight to disk.
+#
+#####################################################################################################################
+
+# this returns numWords distinct made-up words, made only of lowercase letters, so that the tokenizer of the
+# Activity scripts reads every one of them back as a single word: "qa", "qb", ..., "qz", "qba", ...
+def syntheticWords (numWords):
+        returnVal = []
+        for i in range (numWords):
+                word = ""
+                while True:
+                        word = chr (ord ('a') + i % 26) + word
+                        i = i // 26
+                        if i == 0:
+                                break
+                returnVal.append ("q" + word)
+        return returnVal
+
+# this writes the documents of one block as lines of the 20_news_same_line.txt format... each document is
+# filed under the newsgroup "topic<t>", where t is its most likely topic, so that the Activity scripts find a
+# label in the docID, and its text is its words, each one repeated as often as it occurs.  The line ends
+# with </doc>, as in the real corpus, so ingestDocument reads back the generated counts plus one "doc"
+# word per document
+def writeTextBlock (f, vocabulary, firstDocID, topicsInDocs, docs, indices, counts):
+        words = vocabulary[np.repeat (indices, counts)]
+        wordsInDocs = np.bincount (docs, weights=counts, minlength=len (topicsInDocs)).astype (np.int64)
+        ends = np.cumsum (wordsInDocs)
+        for doc, (start, end) in enumerate (zip (ends - wordsInDocs, ends)):
+                docID = firstDocID + doc
+                f.write ('<doc id="synthetic/topic%d/%d" url="synthetic/%d" title="%d">%s</doc>\n' % (np.argmax (topicsInDocs[doc]), docID, docID, docID, " ".join (words[start:end])))
+
+# this generates one shard, in a process of the pool, and returns (fileName, numDocs, numWords in it)
+def generateShard (task):
+        fileName, seedSequence, wordsInTopic, beta, numDocs, wordsPerDoc, firstDocID, format, blockSize = task
+        rng = np.random.default_rng (seedSequence)
+        blocks, numTokens, start = [], 0, 0
+        vocabulary = np.array (syntheticWords (wordsInTopic.shape[1]), dtype=object)
+        with open (fileName, "w" if format == "text" else "wb") as f:
+                for topicsInDocs, docs, indices, counts in generateBlocks (aliasTables (wordsInTopic), beta, numDocs, wordsPerDoc, rng, blockSize):
+                        if format == "text":
+                                writeTextBlock (f, vocabulary, firstDocID + start, topicsInDocs, docs, indices, counts)
+                        else:
+                                blocks.append ((docs + start, indices, counts, np.argmax (topicsInDocs, axis=1).astype (np.int32)))
+                        numTokens = numTokens + int (np.sum (counts))
+                        start = start + len (topicsInDocs)
+                if format == "npz":
+                        #
+                        # the arrays are saved under the names that scipy.sparse.save_npz uses, so that
+                        # scipy.sparse.load_npz reads the shard back as a CSR matrix, along with the topic
+                        # that each document is filed under
+                        indptr, indices, counts = stackBlocks ([x[:3] for x in blocks], numDocs)
+                        topics = np.concatenate ([x[3] for x in blocks]) if len (blocks) > 0 else np.zeros (0, dtype=np.int32)
+                        np.savez (f, data=counts, indices=indices, indptr=indptr, format=np.bytes_ (b"csr"),
+                                shape=np.array ([numDocs, wordsInTopic.shape[1]]), topics=topics)
+        return (fileName, numDocs, numTokens)
+
+# this generates numDocs documents in shards of docsPerShard documents, with numProcesses processes (one per
+# core by default), writes shard i to shard<i>.npz or shard<i>.txt in the given directory, and returns the
+# (fileName, numDocs, numWords) of every shard, in order
+def generateShards (directory, wordsInTopic, beta, numDocs, wordsPerDoc=1000, docsPerShard=10000, seed=0, format="npz", numProcesses=None, blockSize=4096, log=print):
+        if format not in ["npz", "text"]:
+                raise ValueError ("format has to be \"npz\" or \"text\", but got %r" % (format,))
+        os.makedirs (directory, exist_ok=True)
+        numShards = (numDocs + docsPerShard - 1) // docsPerShard
+        seedSequences = np.random.SeedSequence (seed).spawn (numShards)
+        tasks = []
+        for i in range (numShards):
+                start, end = i * docsPerShard, min ((i + 1) * docsPerShard, numDocs)
+                fileName = os.path.join (directory, "shard%05d.%s" % (i, "npz" if format == "npz" else "txt"))
+                tasks.append ((fileName, seedSequences[i], wordsInTopic, beta, end - start, np.broadcast_to (wordsPerDoc, numDocs)[start:end], start, format, blockSize))
+        returnVal = []
+        with multiprocessing.Pool (min (numProcesses or os.cpu_count (), max (numShards, 1))) as pool:
+                for result in pool.imap (generateShard, tasks):
+                        log ("wrote %s: %d documents, %d words" % result)
+                        returnVal.append (result)
+        return returnVal
@@ -29,6 +29,66 @@
 
 import re
 import numpy as np
+from pyspark import StorageLevel
+from ingestion import ingestDocument, wordCounts, allTokens, dictionaryPositions
+from corpus_store import CorpusStore, readCorpus, tokenPositions, reducePartitions
+from document_frequencies import computeDocumentFrequencies, inverseDocumentFrequencies
+from projections import RandomProjection
+from normal_equations import computeGramMatrix, computeNormalEquations, solveNormalEquations
+from sgd_trainer import SgdTrainer
+from persistence import PersistencePlan
+from model_store import saveArtifacts, loadArtifacts
+
+# the corpus is read with the functions in ingestion.py and tokenizer.py, its idf is counted with the ones in
+# document_frequencies.py, the documents are mapped down to 1000 dimensions with the ones in projections.py, and
+# the regression is fit with the ones in normal_equations.py and sgd_trainer.py, all on the workers, so ship
+# those files out to them
+sc.addPyFile ("tokenizer.py")
+sc.addPyFile ("ingestion.py")
+sc.addPyFile ("document_frequencies.py")
+sc.addPyFile ("projections.py")
+sc.addPyFile ("normal_equations.py")
+sc.addPyFile ("sgd_trainer.py")
+
+# set this to the directory of a store written by corpus_store.py (python corpus_store.py 20_news_same_line.txt
+# newsgroupCorpus) to read the corpus from there, already tokenized, instead of parsing the text file below;
+# the workers read the store themselves, so ship corpus_store.py out to them as well
+corpusDirectory = None
+sc.addPyFile ("corpus_store.py")
+
+# this is how the regression parameters are computed at the end.  With "cholesky" (or "lstsq"), X^T X and X^T y
+# are built together in one single pass over the documents, and the normal equations are then solved on the
+# driver (see normal_equations.py); with "inverse", X^T X is built and explicitly inverted, and a second
+# pass multiplies every document by that inverse.  With "sgd", there is no X^T X at all: the regression is
+# fit by mini-batch stochastic gradient descent (see sgd_trainer.py), with the settings below, which scales
+# to far more dimensions and documents, and can warm-start from earlier regression parameters.  ridge is
+# added along the diagonal of X^T X first (or, with "sgd", as the matching penalty on the parameters), which
+# keeps the system well conditioned; 0.0 gives the plain least squares fit
+regressionSolver = "cholesky"
+ridge = 0.0
+
+# with regressionSolver = "sgd", each epoch of the trainer is one pass over the documents, in which every
+# partition steps through its own documents in a random order, sgdBatchSize at a time (see sgd_trainer.py for
+# how close 20 epochs get to the closed form solution).  Set
+# sgdInitialParams to the parameters of an earlier run (say, loadArtifacts (directory)["regressionParams"])
+# to start from there rather than from zero
+sgdBatchSize = 64
+sgdEpochs = 20
+sgdLearningRate = 0.5
+sgdSchedule = "constant"
+sgdInitialParams = None
+
+# this is how each of the datasets that more than one Spark action reads below is kept around between those
+# actions (see persistence.py).  The token IDs are the only thing built from the raw text, so they spill to
+# disk rather than ever being re-read from S3, and the sparse vectors are small, so they stay in memory.  The
+# 1000-dimensional vectors (8KB per document) are only read more than once with regressionSolver = "inverse"
+# (twice in a row, so they are kept in memory) or "sgd" (once per epoch, so they may spill to disk).  Set a
+# level to None to not persist that dataset at all.  Each dataset is released as soon as the last stage that
+# reads it has run, and every action logs which datasets it computed and which it found in the cache
+persistencePlan = PersistencePlan (sc, {
+        "keyAndTokenIDs": StorageLevel.MEMORY_AND_DISK,
+        "allDocsAsNumpyArrays": StorageLevel.MEMORY_ONLY,
+        "allDocsAsLowerDimNumpyArrays": {"inverse": StorageLevel.MEMORY_ONLY, "sgd": StorageLevel.MEMORY_AND_DISK}.get (regressionSolver)})
 
 # load up all of the 19997 documents in the corpus
 corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt")
@@ -36,25 +96,34 @@ corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt
 # each entry in validLines will be a line from the text file
 validLines = corpus.filter(lambda x : 'id' in x)
 
-# now we transform it into a bunch of (docID, text) pairs
-keyAndText = validLines.map(lambda x : (x[x.index('id="') + 4 : x.index('" url=')], x[x.index('">') + 2:]))
-
-# now we split the text in each (docID, text) pair into a list of words
-# after this, we have a data set with (docID, ["word1", "word2", "word3", ...])
-# we have a bit of fancy regular expression stuff here to make sure that we do not
-# die on some of the documents
-regex = re.compile('[^a-zA-Z]')
-keyAndListOfWords = keyAndText.map(lambda x : (str(x[0]), regex.sub(' ', x[1]).lower().split()))
-
-# now get the top 20,000 words... first change (docID, ["word1", "word2", "word3", ...])
-# to ("word1", 1) ("word2", 1)...
-allWords = keyAndListOfWords.flatMap(lambda x: ((j, 1) for j in x[1]))
-
-# now, count all of the words, giving us ("word1", 1433), ("word2", 3423423), etc.
-allCounts = allWords.reduceByKey (lambda a, b: a + b)
-
-# and get the top 20,000 words in a local array
-topWords = allCounts.top (20000, lambda x : x[1])
+# now we parse each line into its docID and its text, and split the text into a list of words, all in a single
+# pass over the corpus (see ingestion.py).  Each document comes out in a compact token-ID form, as a
+# (docID, (["word1", "word2", "word3", ...], [tokenID1, tokenID2, tokenID3, ...])) pair, where the list holds
+# each distinct word of the document once and the array is the whole text with every word replaced by its
+# position in that list.  This is the only place where the raw text is ever read and tokenized: we persist the
+# result, and counting the words, looking them up in the dictionary and building the vectors below all start
+# from it, rather than going back to S3 and re-parsing the text for every single Spark action
+# With a corpusDirectory, each document comes straight out of the store instead, as a
+# ((docID, newsgroupID), [tokenID1, tokenID2, tokenID3, ...]) pair, where every token ID is the position of the
+# word in the vocabulary of the whole corpus, most common word first
+keyAndTokenIDs = persistencePlan.persist ("keyAndTokenIDs", validLines.map (ingestDocument) if corpusDirectory is None else readCorpus (sc, corpusDirectory))
+
+# now get the top 20,000 words (a store has them counted and sorted already)
+if corpusDirectory is None:
+        #
+        # first change each document to one ("word1", count1) ("word2", count2)... pair per distinct word in it
+        allWords = keyAndTokenIDs.flatMap (lambda x: wordCounts (x[1]))
+        #
+        # now, count all of the words, giving us ("word1", 1433), ("word2", 3423423), etc.
+        allCounts = allWords.reduceByKey (lambda a, b: a + b)
+        #
+        # and get the top 20,000 words in a local array
+        topWords = allCounts.top (20000, lambda x : x[1])
+else:
+        #
+        # with ties broken the same way as allCounts.top breaks them above (see topWords in corpus_store.py)
+        topWords = CorpusStore (corpusDirectory).topWords (20000, reducePartitions (validLines))
+persistencePlan.report ("topWords")
 
 # and we'll create a RDD that has a bunch of (word, dictNum) pairs
 # start by creating an RDD that has the number 0 thru 20000
@@ -65,91 +134,179 @@ twentyK = sc.parallelize(range(20000))
 # the number will be the spot in the dictionary used to tell us where the word is located
 dictionary = twentyK.map (lambda x : (topWords[x][0], x))
 
-# next, we get a RDD that has, for each (docID, ["word1", "word2", "word3", ...]),
-# ("word1", docID), ("word2", docId), ...
-allWords = keyAndListOfWords.flatMap(lambda x: ((j, x[0]) for j in x[1]))
-
-# and now join/link them, to get a bunch of ("word1", (dictionaryPos, docID)) pairs
-allDictionaryWords = dictionary.join (allWords)
-
-# and drop the actual word itself to get a bunch of (docID, dictionaryPos) pairs
-justDocAndPos = allDictionaryWords.map (lambda x: (x[1][1], x[1][0]))
-
-# now get a bunch of (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
-allDictionaryWordsInEachDoc = justDocAndPos.groupByKey ()
+# topWords is already sitting on the driver, so by default we ship the whole vocabulary out to the workers
+# once, as a broadcast ("word", dictionaryPos) hash table, and look up the words in each document right
+# where that document lives.  Set this to False to instead link the words to the dictionary with a join,
+# which shuffles every single (word, docID) pair in the corpus against the 20,000-row dictionary RDD
+useBroadcastDictionary = True
+
+if corpusDirectory is not None:
+        #
+        # the store maps every token ID straight to its dictionary position (or -1) with one array, shipped out
+        # to the workers once, so all that is left is to look up the token IDs of each document in it
+        positionOfToken = sc.broadcast (CorpusStore (corpusDirectory).dictionaryPositions (topWords))
+        allDictionaryWordsInEachDoc = keyAndTokenIDs.map (lambda x: (x[0], tokenPositions (x[1], positionOfToken.value))).filter (lambda x: len (x[1]) > 0)
+elif useBroadcastDictionary:
+        #
+        # this is the hash table that maps "mostcommonword" to 0, "nextmostcommon" to 1, and so on
+        dictionaryLookup = sc.broadcast (dict ((topWords[x][0], x) for x in range (20000)))
+        #
+        # now, map each document directly to a (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...])
+        # pair, dropping any word that is not in the dictionary; each distinct word of a document is only
+        # looked up once.  Documents with no dictionary words at all are dropped, just as with the join
+        allDictionaryWordsInEachDoc = keyAndTokenIDs.map (lambda x: (x[0], dictionaryPositions (x[1], dictionaryLookup.value))).filter (lambda x: len (x[1]) > 0)
+else:
+        #
+        # next, we get a RDD that has, for each document, with its words read back off its token IDs,
+        # ("word1", docID), ("word2", docId), ...
+        allWords = keyAndTokenIDs.flatMap (lambda x: ((j, x[0]) for j in allTokens (x[1])))
+        #
+        # and now join/link them, to get a bunch of ("word1", (dictionaryPos, docID)) pairs
+        allDictionaryWords = dictionary.join (allWords)
+        #
+        # and drop the actual word itself to get a bunch of (docID, dictionaryPos) pairs
+        justDocAndPos = allDictionaryWords.map (lambda x: (x[1][1], x[1][0]))
+        #
+        # now get a bunch of (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
+        allDictionaryWordsInEachDoc = justDocAndPos.groupByKey ()
 
 # now, extract the newsgrouID, so that on input we have a bunch of
 # (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs, but on output we 
 # have a bunch of ((docID, newsgroupID) [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
 # The newsgroupID is the name of the newsgroup extracted from the docID... for example 
 # if the docID is "20_newsgroups/comp.graphics/37261" then the newsgroupID will be "s/comp.graphics/"
-regex = re.compile('/.*?/')
-allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc.map (lambda x: ((x[0], regex.search(x[0]).group (0)), x[1]))
-
-# this function gets a list of dictionaryPos values, and then creates a TF vector
-# corresponding to those values... for example, if we get [3, 4, 1, 1, 2] we would in the
-# end have [0, 2/5, 1/5, 1/5, 1/5] because 0 appears zero times, 1 appears twice, 2 appears once, etc.
+# (the documents of a store are keyed by their (docID, newsgroupID) pairs already)
+newsgroupRegex = re.compile('/.*?/')
+if corpusDirectory is None:
+        allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc.map (lambda x: ((x[0], newsgroupRegex.search(x[0]).group (0)), x[1]))
+else:
+        allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc
+
+# this function gets a list of dictionaryPos values, and then creates a sparse TF vector
+# corresponding to those values.  A typical document only touches a few hundred of the 20,000 dictionary
+# slots, so instead of a dense np.zeros (20000) array we keep an (indices, values) pair of numpy arrays,
+# where indices holds the sorted dictionary positions that actually occur and values holds their TF...
+# for example, if we get [3, 4, 1, 1, 2] we would in the end have ([1, 2, 3, 4], [2/5, 1/5, 1/5, 1/5])
+# because 1 appears twice, 2 appears once, etc., and 0 appears zero times so it is not stored at all
 def buildArray (listOfIndices):
-        returnVal = np.zeros (20000)
-        for index in listOfIndices:
-                returnVal[index] = returnVal[index] + 1
-        mysum = np.sum (returnVal)
-        returnVal = np.divide (returnVal, mysum)
-        return returnVal
+        indices, counts = np.unique (np.fromiter (listOfIndices, dtype=np.int32), return_counts=True)
+        return (indices, np.divide (counts, np.sum (counts)))
 
 # this gets us a bunch of ((docID, newsgroupID) [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
-# and converts the dictionary positiions to a bag-of-words numpy array... 
-allDocsAsNumpyArrays = allDictionaryWordsInEachDocWithNewsgroup.map (lambda x: (x[0], buildArray (x[1])))
+# and converts the dictionary positiions to a sparse bag-of-words array... 
+allDocsAsNumpyArrays = persistencePlan.persist ("allDocsAsNumpyArrays", allDictionaryWordsInEachDocWithNewsgroup.map (lambda x: (x[0], buildArray (x[1]))))
 
-# now, crete a version of allDocsAsNumpyArrays where, in the array, every entry is either zero or
-# one.  A zero means that the word does not occur, and a one means that it does.
-zeroOrOne = allDocsAsNumpyArrays.map (lambda x: (x[0], np.clip (np.multiply (x[1], 9e9), 0, 1)))
+# now, crete a version of allDocsAsNumpyArrays that only has the dictionary positions that occur in
+# each document.  This is the sparse version of a vector where every entry is either zero or one... the
+# indices array lists each word in the document exactly once, and every other entry is implicitly zero
+zeroOrOne = allDocsAsNumpyArrays.map (lambda x: (x[0], x[1][0]))
 
-# now, add up all of those arrays into a single array, where the i^th entry tells us how many
-# individual documents the i^th word in the dictionary appeared in
-dfArray = zeroOrOne.reduce (lambda x1, x2: (("", np.add (x1[1], x2[1]))))[1]
+# now, add up all of those documents into a single array, where the i^th entry tells us how many
+# individual documents the i^th word in the dictionary appeared in, and count the documents in that same
+# pass, rather than assuming how many there are (see document_frequencies.py)... only the 20,000 entry
+# totals and the counts (one per partition) ever leave the workers
+dfArray, numDocs = computeDocumentFrequencies (zeroOrOne, 20000)
+persistencePlan.report ("dfArray")
 
-# create an array of 20,000 entries, each entry with the value 19997.0
-multiplier = np.full (20000, 19997.0)
+# the sparse vectors are now all cached, and everything below is built from them, so the token IDs can go
+persistencePlan.release ("keyAndTokenIDs")
 
 # and get the version of dfArray where the i^th entry is the inverse-document frequency for the
-# i^th word in the corpus
-idfArray = np.log (np.divide (multiplier, dfArray))
+# i^th word in the corpus, log (numDocs / df)
+idfArray = inverseDocumentFrequencies (dfArray, numDocs)
 
-# and finally, convert all of the tf vectors in allDocsAsNumpyArrays to tf * idf vectors
-allDocsAsNumpyArrays = allDocsAsNumpyArrays.map (lambda x: (x[0], np.multiply (x[1], idfArray)))
+# and finally, convert all of the tf vectors in allDocsAsNumpyArrays to tf * idf vectors... we only
+# need to look up the idf values for the dictionary positions that are actually in each document
+allDocsAsNumpyArrays = allDocsAsNumpyArrays.map (lambda x: (x[0], (x[1][0], np.multiply (x[1][1], idfArray[x[1][0]]))))
 
 # create a 20,000 by 1000 matrix where each entry is sampled from a Normal (0, 1) distribution...
-# this will serve to map our 20,000 dimensional vectors down to 1000 dimensions
-mappingMatrix = np.random.randn (20000, 1000)
-
-# now, map all of our tf * idf vectors down to 1000 dimensions, using a matrix multiply...
-# this will give us an RDD consisteing of ((docID, newsgroupID), numpyArray) pairs, where
-# the array is a tf * idf vector mapped down into a lower-dimensional space
-allDocsAsLowerDimNumpyArrays = allDocsAsNumpyArrays.map (lambda x: (x[0], np.dot (x[1], mappingMatrix)))
-
-# and now take an outer product of each of those 1000 dimensional vectors with themselves
-allOuters = allDocsAsLowerDimNumpyArrays.map (lambda x: (x[0], np.outer (x[1], x[1])))
-
-# and aggregate all of those 1000 * 1000 matrices into a single matrix, by adding them all up...
-# this will give us the complete gram matrix
-gramMatrix = allOuters.aggregate (np.zeros ((1000, 1000)), lambda x1, x2: x1 + x2[1], lambda x1, x2: x1 + x2)
-
-# take the inverse of the gram matrix
-invGram = np.linalg.inv (gramMatrix)
-
-# now, go through allDocsAsNumpyArrays and multiply each of those 1000-dimensional vectors by the
-# gram matrix... allRows will have a bunch of ((docID, newsgroupID), numpyArray) pairs, where the
-# array is the mapped TF * IDF vector, multiplied by the Gram matrix
-allRows = allDocsAsLowerDimNumpyArrays.map (lambda x: (x[0], np.dot (invGram, x[1])))
-
-# and now, multiply each entry allRows by 1 if the document came from a religion-oriented newsgroup;
-# that is, '/soc.religion.christian/' or '/alt.atheism/' or '/talk.religion.misc/', and by a -1 if
-# it did not come from a religion-oriented newsgroup
-allRowsMapped =  allRows.map (lambda x: (x[0], x[1] if (x[0][1] == '/soc.religion.christian/' or x[0][1] == '/alt.atheism/' or x[0][1] == '/talk.religion.misc/') else np.multiply (-1, x[1])))
-
-# finally, we can compute the vector of regression parameters by simply adding up all of the vectors
-# that we had in the allRowsMapped RDD
-regressionParams = allRowsMapped.aggregate (np.zeros (1000), lambda x1, x2: x1 + x2[1], lambda x1, x2: x1 + x2)
+# this will serve to map our 20,000 dimensional vectors down to 1000 dimensions.  The matrix is generated
+# from projectionSeed (see projections.py), so every run with the same seed trains the same model, and
+# the workers regenerate it from the seed themselves rather than being sent all 160MB of it.  Set
+# projectionSparsity to "sqrt" to use the very sparse random projection of Li et al. instead, where each
+# entry is +/- sqrt (141) or, most of the time, zero, and projectionDtype to np.float32 to halve the memory
+# that a dense matrix takes... run projection_benchmark.py to see what each choice does to speed and accuracy
+projectionSeed = 330
+projectionSparsity = None
+projectionDtype = np.float64
+projection = RandomProjection (20000, 1000, projectionSeed, sparsity=projectionSparsity, dtype=projectionDtype)
+mappingMatrix = projection.matrix ()
+
+# now, map all of our tf * idf vectors down to 1000 dimensions, straight from the dictionary positions and
+# tf * idf values of each document: only the rows of the matrix at the dictionary positions that are in the
+# document matter, so this costs the number of distinct words in the document times 1000 multiply-adds,
+# rather than 20,000 times 1000... this will give us an RDD consisteing of ((docID, newsgroupID), numpyArray)
+# pairs, where the array is a tf * idf vector mapped down into a lower-dimensional space
+allDocsAsLowerDimNumpyArrays = persistencePlan.persist ("allDocsAsLowerDimNumpyArrays", allDocsAsNumpyArrays.map (lambda x: (x[0], projection.project (x[1]))))
+
+# we fit the regression to a label of 1 for every document that came from a religion-oriented newsgroup;
+# that is, '/soc.religion.christian/' or '/alt.atheism/' or '/talk.religion.misc/', and -1 for every
+# document that did not come from a religion-oriented newsgroup
+def religionLabel (key):
+        return 1.0 if (key[1] == '/soc.religion.christian/' or key[1] == '/alt.atheism/' or key[1] == '/talk.religion.misc/') else -1.0
+
+# Set gramTreeDepth to 2 or more to add up the partial sums below in a tree on the workers, rather than all
+# of them at once on the driver, which helps when there are many partitions
+gramTreeDepth = None
+
+if regressionSolver == "inverse":
+        #
+        # now add up the outer product of each of those 1000 dimensional vectors with itself... this will
+        # give us the complete gram matrix.  Rather than building a 1000 * 1000 matrix for every single
+        # document, each partition stacks its vectors, 1024 at a time, into a matrix X and adds X^T X (one
+        # BLAS call) to a running total, so that just one 1000 * 1000 partial sum per partition is ever sent
+        # back (see normal_equations.py)
+        gramMatrix = computeGramMatrix (allDocsAsLowerDimNumpyArrays, 1000, treeDepth=gramTreeDepth)
+        persistencePlan.report ("gramMatrix")
+        #
+        # the 1000-dimensional vectors are cached now, and they are all that the regression below reads
+        persistencePlan.release ("allDocsAsNumpyArrays")
+        #
+        # take the inverse of the gram matrix
+        invGram = np.linalg.inv (gramMatrix + ridge * np.eye (1000))
+        #
+        # now, go through allDocsAsNumpyArrays and multiply each of those 1000-dimensional vectors by the
+        # gram matrix... allRows will have a bunch of ((docID, newsgroupID), numpyArray) pairs, where the
+        # array is the mapped TF * IDF vector, multiplied by the Gram matrix
+        allRows = allDocsAsLowerDimNumpyArrays.map (lambda x: (x[0], np.dot (invGram, x[1])))
+        #
+        # and now, multiply each entry allRows by its label, 1 or -1
+        allRowsMapped =  allRows.map (lambda x: (x[0], np.multiply (religionLabel (x[0]), x[1])))
+        #
+        # finally, we can compute the vector of regression parameters by simply adding up all of the vectors
+        # that we had in the allRowsMapped RDD
+        regressionParams = allRowsMapped.aggregate (np.zeros (1000), lambda x1, x2: x1 + x2[1], lambda x1, x2: x1 + x2)
+elif regressionSolver == "sgd":
+        #
+        # fit the regression parameters by mini-batch stochastic gradient descent, which never builds X^T X
+        trainer = SgdTrainer (1000, religionLabel, batchSize=sgdBatchSize, epochs=sgdEpochs, learningRate=sgdLearningRate,
+                schedule=sgdSchedule, ridge=ridge, initialParams=sgdInitialParams)
+        regressionParams = trainer.fit (allDocsAsLowerDimNumpyArrays)
+        gramMatrix, invGram = None, None
+else:
+        #
+        # in one single pass over the 1000 dimensional vectors, get both the gram matrix X^T X and X^T y,
+        # where y holds the labels... each partition stacks its vectors, 1024 at a time, into a matrix X,
+        # and adds X^T X (one BLAS call) and X^T y to its running totals, so that just one 1000 * 1000
+        # partial sum per partition is ever sent back (see normal_equations.py)
+        gramMatrix, xTransposeY = computeNormalEquations (allDocsAsLowerDimNumpyArrays, 1000, religionLabel, treeDepth=gramTreeDepth)
+        persistencePlan.report ("gramMatrix")
+        #
+        # and then solve (X^T X + ridge * I) regressionParams = X^T y right here on the driver, rather than
+        # computing the inverse of the gram matrix and making a second pass over all of the documents
+        invGram = None
+        regressionParams = solveNormalEquations (gramMatrix, xTransposeY, ridge=ridge, method=regressionSolver)
+
+persistencePlan.report ("regressionParams")
+
+# and that is the end of the training run
+persistencePlan.releaseAll ()
+
+# set this to a directory name to save everything that was trained above into that directory (see
+# model_store.py); loadArtifacts (modelDirectory) gets it all back later, with the arrays memory-mapped
+modelDirectory = None
+
+if modelDirectory is not None:
+        saveArtifacts (modelDirectory, topWords, idfArray=idfArray, mappingMatrix=mappingMatrix, gramMatrix=gramMatrix, invGram=invGram, regressionParams=regressionParams)
 
 regressionParams
@@ -19,8 +19,11 @@
 #
 #####################################################################################################################
 
-import re
 import numpy as np
+from tokenizer import tokenize
+
+# the text is split into words with the tokenizer in tokenizer.py on the workers, so ship that file out to them
+sc.addPyFile ("tokenizer.py")
 
 # load up all of the 19997 documents in the corpus
 corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt")
@@ -33,10 +36,9 @@ keyAndText = validLines.map(lambda x : (x[x.index('id="') + 4 : x.index('" url='
 
 # now we split the text in each (docID, text) pair into a list of words
 # after this, we have a data set with (docID, ["word1", "word2", "word3", ...])
-# we have a bit of fancy regular expression stuff here to make sure that we do not
+# the tokenizer keeps only the runs of letters, lowercased, to make sure that we do not
 # die on some of the documents
-regex = re.compile('[^a-zA-Z]')
-keyAndListOfWords = keyAndText.map(lambda x : (str(x[0]), regex.sub(' ', x[1]).lower().split()))
+keyAndListOfWords = keyAndText.map(lambda x : (str(x[0]), tokenize (x[1])))
 
 # now get the top 20,000 words... first change (docID, ["word1", "word2", "word3", ...])
 # to ("word1", 1) ("word2", 1)...
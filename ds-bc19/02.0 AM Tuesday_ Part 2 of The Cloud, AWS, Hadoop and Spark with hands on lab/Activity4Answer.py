@@ -21,6 +21,19 @@
 
 import re
 import numpy as np
+from ingestion import ingestDocument, wordCounts, allTokens, dictionaryPositions
+from corpus_store import CorpusStore, readCorpus, tokenPositions, reducePartitions
+
+# the corpus is read with the functions in ingestion.py and tokenizer.py on the workers, so ship those files
+# out to them
+sc.addPyFile ("tokenizer.py")
+sc.addPyFile ("ingestion.py")
+
+# set this to the directory of a store written by corpus_store.py (python corpus_store.py 20_news_same_line.txt
+# newsgroupCorpus) to read the corpus from there, already tokenized, instead of parsing the text file below;
+# the workers read the store themselves, so ship corpus_store.py out to them as well
+corpusDirectory = None
+sc.addPyFile ("corpus_store.py")
 
 # load up all of the 19997 documents in the corpus
 corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt")
@@ -28,25 +41,33 @@ corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt
 # each entry in validLines will be a line from the text file
 validLines = corpus.filter(lambda x : 'id' in x)
 
-# now we transform it into a bunch of (docID, text) pairs
-keyAndText = validLines.map(lambda x : (x[x.index('id="') + 4 : x.index('" url=')], x[x.index('">') + 2:]))
-
-# now we split the text in each (docID, text) pair into a list of words
-# after this, we have a data set with (docID, ["word1", "word2", "word3", ...])
-# we have a bit of fancy regular expression stuff here to make sure that we do not
-# die on some of the documents
-regex = re.compile('[^a-zA-Z]')
-keyAndListOfWords = keyAndText.map(lambda x : (str(x[0]), regex.sub(' ', x[1]).lower().split()))
-
-# now get the top 20,000 words... first change (docID, ["word1", "word2", "word3", ...])
-# to ("word1", 1) ("word2", 1)...
-allWords = keyAndListOfWords.flatMap(lambda x: ((j, 1) for j in x[1]))
-
-# now, count all of the words, giving us ("word1", 1433), ("word2", 3423423), etc.
-allCounts = allWords.reduceByKey (lambda a, b: a + b)
-
-# and get the top 20,000 words in a local array
-topWords = allCounts.top (20000, lambda x : x[1])
+# now we parse each line into its docID and its text, and split the text into a list of words, all in a single
+# pass over the corpus (see ingestion.py).  Each document comes out in a compact token-ID form, as a
+# (docID, (["word1", "word2", "word3", ...], [tokenID1, tokenID2, tokenID3, ...])) pair, where the list holds
+# each distinct word of the document once and the array is the whole text with every word replaced by its
+# position in that list.  This is the only place where the raw text is ever read and tokenized: we keep the
+# result in memory, and counting the words, looking them up in the dictionary and building the vectors below
+# all start from it, rather than going back to S3 and re-parsing the text for every single Spark action
+# With a corpusDirectory, each document comes straight out of the store instead, as a
+# ((docID, newsgroupID), [tokenID1, tokenID2, tokenID3, ...]) pair, where every token ID is the position of the
+# word in the vocabulary of the whole corpus, most common word first
+keyAndTokenIDs = (validLines.map (ingestDocument) if corpusDirectory is None else readCorpus (sc, corpusDirectory)).cache ()
+
+# now get the top 20,000 words (a store has them counted and sorted already)
+if corpusDirectory is None:
+        #
+        # first change each document to one ("word1", count1) ("word2", count2)... pair per distinct word in it
+        allWords = keyAndTokenIDs.flatMap (lambda x: wordCounts (x[1]))
+        #
+        # now, count all of the words, giving us ("word1", 1433), ("word2", 3423423), etc.
+        allCounts = allWords.reduceByKey (lambda a, b: a + b)
+        #
+        # and get the top 20,000 words in a local array
+        topWords = allCounts.top (20000, lambda x : x[1])
+else:
+        #
+        # with ties broken the same way as allCounts.top breaks them above (see topWords in corpus_store.py)
+        topWords = CorpusStore (corpusDirectory).topWords (20000, reducePartitions (validLines))
 
 # and we'll create a RDD that has a bunch of (word, dictNum) pairs
 # start by creating an RDD that has the number 0 thru 20000
@@ -57,38 +78,66 @@ twentyK = sc.parallelize(range(20000))
 # the number will be the spot in the dictionary used to tell us where the word is located
 dictionary = twentyK.map (lambda x : (topWords[x][0], x))
 
-# next, we get a RDD that has, for each (docID, ["word1", "word2", "word3", ...]),
-# ("word1", docID), ("word2", docId), ...
-allWords = keyAndListOfWords.flatMap(lambda x: ((j, x[0]) for j in x[1]))
-
-# and now join/link them, to get a bunch of ("word1", (dictionaryPos, docID)) pairs
-allDictionaryWords = dictionary.join (allWords)
-
-# and drop the actual word itself to get a bunch of (docID, dictionaryPos) pairs
-justDocAndPos = allDictionaryWords.map (lambda x: (x[1][1], x[1][0]))
-
-# now get a bunch of (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
-allDictionaryWordsInEachDoc = justDocAndPos.groupByKey ()
+# topWords is already sitting on the driver, so by default we ship the whole vocabulary out to the workers
+# once, as a broadcast ("word", dictionaryPos) hash table, and look up the words in each document right
+# where that document lives.  Set this to False to instead link the words to the dictionary with a join,
+# which shuffles every single (word, docID) pair in the corpus against the 20,000-row dictionary RDD
+useBroadcastDictionary = True
+
+if corpusDirectory is not None:
+        #
+        # the store maps every token ID straight to its dictionary position (or -1) with one array, shipped out
+        # to the workers once, so all that is left is to look up the token IDs of each document in it
+        positionOfToken = sc.broadcast (CorpusStore (corpusDirectory).dictionaryPositions (topWords))
+        allDictionaryWordsInEachDoc = keyAndTokenIDs.map (lambda x: (x[0], tokenPositions (x[1], positionOfToken.value))).filter (lambda x: len (x[1]) > 0)
+elif useBroadcastDictionary:
+        #
+        # this is the hash table that maps "mostcommonword" to 0, "nextmostcommon" to 1, and so on
+        dictionaryLookup = sc.broadcast (dict ((topWords[x][0], x) for x in range (20000)))
+        #
+        # now, map each document directly to a (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...])
+        # pair, dropping any word that is not in the dictionary; each distinct word of a document is only
+        # looked up once.  Documents with no dictionary words at all are dropped, just as with the join
+        allDictionaryWordsInEachDoc = keyAndTokenIDs.map (lambda x: (x[0], dictionaryPositions (x[1], dictionaryLookup.value))).filter (lambda x: len (x[1]) > 0)
+else:
+        #
+        # next, we get a RDD that has, for each document, with its words read back off its token IDs,
+        # ("word1", docID), ("word2", docId), ...
+        allWords = keyAndTokenIDs.flatMap (lambda x: ((j, x[0]) for j in allTokens (x[1])))
+        #
+        # and now join/link them, to get a bunch of ("word1", (dictionaryPos, docID)) pairs
+        allDictionaryWords = dictionary.join (allWords)
+        #
+        # and drop the actual word itself to get a bunch of (docID, dictionaryPos) pairs
+        justDocAndPos = allDictionaryWords.map (lambda x: (x[1][1], x[1][0]))
+        #
+        # now get a bunch of (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
+        allDictionaryWordsInEachDoc = justDocAndPos.groupByKey ()
 
 # now, extract the newsgrouID, so that on input we have a bunch of
 # (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs, but on output we 
 # have a bunch of ((docID, newsgroupID) [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
 # The newsgroupID is the name of the newsgroup extracted from the docID... for example 
 # if the docID is "20_newsgroups/comp.graphics/37261" then the newsgroupID will be "s/comp.graphics/"
-regex = re.compile('/.*?/')
-allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc.map (lambda x: ((x[0], regex.search(x[0]).group (0)), x[1]))
-
-# this function gets a list of dictionaryPos values, and then creates a bag-of-words array
-# corresponding to those values... for example, if we get [3, 4, 1, 1, 2] we would in the
-# end have [0, 2, 1, 1, 1, ...] because 0 appears zero times, 1 appears twice, 2 appears once, etc.
+# (the documents of a store are keyed by their (docID, newsgroupID) pairs already)
+newsgroupRegex = re.compile('/.*?/')
+if corpusDirectory is None:
+        allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc.map (lambda x: ((x[0], newsgroupRegex.search(x[0]).group (0)), x[1]))
+else:
+        allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc
+
+# this function gets a list of dictionaryPos values, and then creates a sparse bag-of-words array
+# corresponding to those values.  A typical document only touches a few hundred of the 20,000 dictionary
+# slots, so instead of a dense np.zeros (20000) array we keep an (indices, values) pair of numpy arrays,
+# where indices holds the sorted dictionary positions that actually occur and values holds their counts...
+# for example, if we get [3, 4, 1, 1, 2] we would in the end have ([1, 2, 3, 4], [2, 1, 1, 1]) because
+# 1 appears twice, 2 appears once, etc., and 0 appears zero times so it is not stored at all
 def buildArray (listOfIndices):
-        returnVal = np.zeros (20000)
-        for index in listOfIndices:
-                returnVal[index] = returnVal[index] + 1
-        return returnVal
+        indices, counts = np.unique (np.fromiter (listOfIndices, dtype=np.int32), return_counts=True)
+        return (indices, counts.astype (np.float64))
 
 # this gets us a bunch of ((docID, newsgroupID) [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
-# and converts the dictionary positiions to a bag-of-word numpy array
+# and converts the dictionary positiions to a sparse bag-of-words array
 allDocsAsNumpyArrays = allDictionaryWordsInEachDocWithNewsgroup.map (lambda x: (x[0], buildArray (x[1])))
 
 # print a few of the docs
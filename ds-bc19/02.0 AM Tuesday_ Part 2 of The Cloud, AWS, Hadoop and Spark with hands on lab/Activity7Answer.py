@@ -19,6 +19,26 @@
 
 import re
 import numpy as np
+from tokenizer import tokenize
+from ingestion import ingestDocument, wordCounts, allTokens, dictionaryPositions
+from corpus_store import CorpusStore, readCorpus, tokenPositions, reducePartitions
+from document_frequencies import computeDocumentFrequencies, inverseDocumentFrequencies
+from local_engine import KnnEngine, buildDictionaryLookup, vectorize, normalizeArray, buildQueryMatrix, scoreDocsTopK, mergeTopK, voteTopK
+from model_store import saveArtifacts, saveKnnEngine
+
+# the corpus is read with the functions in ingestion.py and tokenizer.py and its idf is counted with the ones in
+# document_frequencies.py, and the document vectors and the batched getPredictions below use helper functions
+# from local_engine.py, all on the workers, so ship those files out to them
+sc.addPyFile ("tokenizer.py")
+sc.addPyFile ("ingestion.py")
+sc.addPyFile ("document_frequencies.py")
+sc.addPyFile ("local_engine.py")
+
+# set this to the directory of a store written by corpus_store.py (python corpus_store.py 20_news_same_line.txt
+# newsgroupCorpus) to read the corpus from there, already tokenized, instead of parsing the text file below;
+# the workers read the store themselves, so ship corpus_store.py out to them as well
+corpusDirectory = None
+sc.addPyFile ("corpus_store.py")
 
 # load up all of the 19997 documents in the corpus
 corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt")
@@ -26,25 +46,33 @@ corpus = sc.textFile ("s3://chrisjermainebucket/comp330_A6/20_news_same_line.txt
 # each entry in validLines will be a line from the text file
 validLines = corpus.filter(lambda x : 'id' in x)
 
-# now we transform it into a bunch of (docID, text) pairs
-keyAndText = validLines.map(lambda x : (x[x.index('id="') + 4 : x.index('" url=')], x[x.index('">') + 2:]))
-
-# now we split the text in each (docID, text) pair into a list of words
-# after this, we have a data set with (docID, ["word1", "word2", "word3", ...])
-# we have a bit of fancy regular expression stuff here to make sure that we do not
-# die on some of the documents
-regex = re.compile('[^a-zA-Z]')
-keyAndListOfWords = keyAndText.map(lambda x : (str(x[0]), regex.sub(' ', x[1]).lower().split()))
-
-# now get the top 20,000 words... first change (docID, ["word1", "word2", "word3", ...])
-# to ("word1", 1) ("word2", 1)...
-allWords = keyAndListOfWords.flatMap(lambda x: ((j, 1) for j in x[1]))
+# now we parse each line into its docID and its text, and split the text into a list of words, all in a single
+# pass over the corpus (see ingestion.py).  Each document comes out in a compact token-ID form, as a
+# (docID, (["word1", "word2", "word3", ...], [tokenID1, tokenID2, tokenID3, ...])) pair, where the list holds
+# each distinct word of the document once and the array is the whole text with every word replaced by its
+# position in that list.  This is the only place where the raw text is ever read and tokenized: we keep the
+# result in memory, and counting the words, looking them up in the dictionary and building the vectors below
+# all start from it, rather than going back to S3 and re-parsing the text for every single Spark action
+# With a corpusDirectory, each document comes straight out of the store instead, as a
+# ((docID, newsgroupID), [tokenID1, tokenID2, tokenID3, ...]) pair, where every token ID is the position of the
+# word in the vocabulary of the whole corpus, most common word first
+keyAndTokenIDs = (validLines.map (ingestDocument) if corpusDirectory is None else readCorpus (sc, corpusDirectory)).cache ()
 
-# now, count all of the words, giving us ("word1", 1433), ("word2", 3423423), etc.
-allCounts = allWords.reduceByKey (lambda a, b: a + b)
-
-# and get the top 20,000 words in a local array
-topWords = allCounts.top (20000, lambda x : x[1])
+# now get the top 20,000 words (a store has them counted and sorted already)
+if corpusDirectory is None:
+        #
+        # first change each document to one ("word1", count1) ("word2", count2)... pair per distinct word in it
+        allWords = keyAndTokenIDs.flatMap (lambda x: wordCounts (x[1]))
+        #
+        # now, count all of the words, giving us ("word1", 1433), ("word2", 3423423), etc.
+        allCounts = allWords.reduceByKey (lambda a, b: a + b)
+        #
+        # and get the top 20,000 words in a local array
+        topWords = allCounts.top (20000, lambda x : x[1])
+else:
+        #
+        # with ties broken the same way as allCounts.top breaks them above (see topWords in corpus_store.py)
+        topWords = CorpusStore (corpusDirectory).topWords (20000, reducePartitions (validLines))
 
 # and we'll create a RDD that has a bunch of (word, dictNum) pairs
 # start by creating an RDD that has the number 0 thru 20000
@@ -55,59 +83,104 @@ twentyK = sc.parallelize(range(20000))
 # the number will be the spot in the dictionary used to tell us where the word is located
 dictionary = twentyK.map (lambda x : (topWords[x][0], x))
 
-# next, we get a RDD that has, for each (docID, ["word1", "word2", "word3", ...]),
-# ("word1", docID), ("word2", docId), ...
-allWords = keyAndListOfWords.flatMap(lambda x: ((j, x[0]) for j in x[1]))
-
-# and now join/link them, to get a bunch of ("word1", (dictionaryPos, docID)) pairs
-allDictionaryWords = dictionary.join (allWords)
+# topWords is already sitting on the driver, so by default we ship the whole vocabulary out to the workers
+# once, as a broadcast ("word", dictionaryPos) hash table, and look up the words in each document right
+# where that document lives.  Set this to False to instead link the words to the dictionary with a join,
+# which shuffles every single (word, docID) pair in the corpus against the 20,000-row dictionary RDD
+useBroadcastDictionary = True
 
-# and drop the actual word itself to get a bunch of (docID, dictionaryPos) pairs
-justDocAndPos = allDictionaryWords.map (lambda x: (x[1][1], x[1][0]))
-
-# now get a bunch of (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
-allDictionaryWordsInEachDoc = justDocAndPos.groupByKey ()
+if corpusDirectory is not None:
+        #
+        # the store maps every token ID straight to its dictionary position (or -1) with one array, shipped out
+        # to the workers once, so all that is left is to look up the token IDs of each document in it
+        positionOfToken = sc.broadcast (CorpusStore (corpusDirectory).dictionaryPositions (topWords))
+        allDictionaryWordsInEachDoc = keyAndTokenIDs.map (lambda x: (x[0], tokenPositions (x[1], positionOfToken.value))).filter (lambda x: len (x[1]) > 0)
+elif useBroadcastDictionary:
+        #
+        # this is the hash table that maps "mostcommonword" to 0, "nextmostcommon" to 1, and so on
+        dictionaryLookup = sc.broadcast (dict ((topWords[x][0], x) for x in range (20000)))
+        #
+        # now, map each document directly to a (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...])
+        # pair, dropping any word that is not in the dictionary; each distinct word of a document is only
+        # looked up once.  Documents with no dictionary words at all are dropped, just as with the join
+        allDictionaryWordsInEachDoc = keyAndTokenIDs.map (lambda x: (x[0], dictionaryPositions (x[1], dictionaryLookup.value))).filter (lambda x: len (x[1]) > 0)
+else:
+        #
+        # next, we get a RDD that has, for each document, with its words read back off its token IDs,
+        # ("word1", docID), ("word2", docId), ...
+        allWords = keyAndTokenIDs.flatMap (lambda x: ((j, x[0]) for j in allTokens (x[1])))
+        #
+        # and now join/link them, to get a bunch of ("word1", (dictionaryPos, docID)) pairs
+        allDictionaryWords = dictionary.join (allWords)
+        #
+        # and drop the actual word itself to get a bunch of (docID, dictionaryPos) pairs
+        justDocAndPos = allDictionaryWords.map (lambda x: (x[1][1], x[1][0]))
+        #
+        # now get a bunch of (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
+        allDictionaryWordsInEachDoc = justDocAndPos.groupByKey ()
 
 # now, extract the newsgrouID, so that on input we have a bunch of
 # (docID, [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs, but on output we 
 # have a bunch of ((docID, newsgroupID) [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
 # The newsgroupID is the name of the newsgroup extracted from the docID... for example 
 # if the docID is "20_newsgroups/comp.graphics/37261" then the newsgroupID will be "s/comp.graphics/"
-regex = re.compile('/.*?/')
-allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc.map (lambda x: ((x[0], regex.search(x[0]).group (0)), x[1]))
+# (the documents of a store are keyed by their (docID, newsgroupID) pairs already)
+newsgroupRegex = re.compile('/.*?/')
+if corpusDirectory is None:
+        allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc.map (lambda x: ((x[0], newsgroupRegex.search(x[0]).group (0)), x[1]))
+else:
+        allDictionaryWordsInEachDocWithNewsgroup = allDictionaryWordsInEachDoc
 
-# this function gets a list of dictionaryPos values, and then creates a TF vector
-# corresponding to those values... for example, if we get [3, 4, 1, 1, 2] we would in the
-# end have [0, 2/5, 1/5, 1/5, 1/5] because 0 appears zero times, 1 appears twice, 2 appears once, etc.
+# this function gets a list of dictionaryPos values, and then creates a sparse TF vector
+# corresponding to those values.  A typical document only touches a few hundred of the 20,000 dictionary
+# slots, so instead of a dense np.zeros (20000) array we keep an (indices, values) pair of numpy arrays,
+# where indices holds the sorted dictionary positions that actually occur and values holds their TF...
+# for example, if we get [3, 4, 1, 1, 2] we would in the end have ([1, 2, 3, 4], [2/5, 1/5, 1/5, 1/5])
+# because 1 appears twice, 2 appears once, etc., and 0 appears zero times so it is not stored at all
 def buildArray (listOfIndices):
+        indices, counts = np.unique (np.fromiter (listOfIndices, dtype=np.int32), return_counts=True)
+        return (indices, np.divide (counts, np.sum (counts)))
+
+# this turns a sparse (indices, values) pair back into a dense 20,000 entry array; we only ever do this
+# for the single query string in getPrediction, never for the documents in the corpus
+def toDense (sparseArray):
         returnVal = np.zeros (20000)
-        for index in listOfIndices:
-                returnVal[index] = returnVal[index] + 1
-        mysum = np.sum (returnVal)
-        returnVal = np.divide (returnVal, mysum)
+        returnVal[sparseArray[0]] = sparseArray[1]
         return returnVal
 
 # this gets us a bunch of ((docID, newsgroupID) [dictionaryPos1, dictionaryPos2, dictionaryPos3...]) pairs
-# and converts the dictionary positiions to a bag-of-words numpy array... 
+# and converts the dictionary positiions to a sparse bag-of-words array... 
 allDocsAsNumpyArrays = allDictionaryWordsInEachDocWithNewsgroup.map (lambda x: (x[0], buildArray (x[1])))
 
-# now, crete a version of allDocsAsNumpyArrays where, in the array, every entry is either zero or
-# one.  A zero means that the word does not occur, and a one means that it does.
-zeroOrOne = allDocsAsNumpyArrays.map (lambda x: (x[0], np.clip (np.multiply (x[1], 9e9), 0, 1)))
+# now, crete a version of allDocsAsNumpyArrays that only has the dictionary positions that occur in
+# each document.  This is the sparse version of a vector where every entry is either zero or one... the
+# indices array lists each word in the document exactly once, and every other entry is implicitly zero
+zeroOrOne = allDocsAsNumpyArrays.map (lambda x: (x[0], x[1][0]))
 
-# now, add up all of those arrays into a single array, where the i^th entry tells us how many
-# individual documents the i^th word in the dictionary appeared in
-dfArray = zeroOrOne.reduce (lambda x1, x2: (("", np.add (x1[1], x2[1]))))[1]
-
-# create an array of 20,000 entries, each entry with the value 19997.0
-multiplier = np.full (20000, 19997.0)
+# now, add up all of those documents into a single array, where the i^th entry tells us how many
+# individual documents the i^th word in the dictionary appeared in, and count the documents in that same
+# pass, rather than assuming how many there are (see document_frequencies.py)... only the 20,000 entry
+# totals and the counts (one per partition) ever leave the workers
+dfArray, numDocs = computeDocumentFrequencies (zeroOrOne, 20000)
 
 # and get the version of dfArray where the i^th entry is the inverse-document frequency for the
-# i^th word in the corpus
-idfArray = np.log (np.divide (multiplier, dfArray))
+# i^th word in the corpus, log (numDocs / df)
+idfArray = inverseDocumentFrequencies (dfArray, numDocs)
+
+# and finally, convert all of the tf vectors in allDocsAsNumpyArrays to tf * idf vectors... we only
+# need to look up the idf values for the dictionary positions that are actually in each document
+allDocsAsNumpyArrays = allDocsAsNumpyArrays.map (lambda x: (x[0], (x[1][0], np.multiply (x[1][1], idfArray[x[1][0]]))))
 
-# and finally, convert all of the tf vectors in allDocsAsNumpyArrays to tf * idf vectors
-allDocsAsNumpyArrays = allDocsAsNumpyArrays.map (lambda x: (x[0], np.multiply (x[1], idfArray)))
+# the dot product of the query with a raw document vector favours long documents, which simply have bigger
+# entries.  With this set to True, every document vector is scaled to unit length once, right here, so that
+# the one dot product per document done by getPrediction, getPredictions and localEngine below is a true
+# cosine similarity (the length of the query is the same for every document, so it never changes the
+# ranking and is not computed at all).  It is off by default, so that the predictions match the outputs
+# listed at the top of this file, which come from the raw dot product
+useCosineSimilarity = False
+
+if useCosineSimilarity:
+        allDocsAsNumpyArrays = allDocsAsNumpyArrays.map (lambda x: (x[0], normalizeArray (x[1])))
 
 # and finally, we have a function that returns the prediction for the label of a string, using a kNN algorithm
 def getPrediction (textInput, k):
@@ -116,19 +189,21 @@ def getPrediction (textInput, k):
         myDoc = sc.parallelize (('', textInput))
         #
         # gives us (word, 1) pair for each word in the doc
-        wordsInThatDoc = myDoc.flatMap (lambda x : ((j, 1) for j in regex.sub(' ', x).lower().split()))
+        wordsInThatDoc = myDoc.flatMap (lambda x : ((j, 1) for j in tokenize (x)))
         #
         # this wil give us a bunch of (word, (dictionaryPos, 1)) pairs
         allDictionaryWordsInThatDoc = dictionary.join (wordsInThatDoc).map (lambda x: (x[1][1], x[1][0])).groupByKey ()
         #
         # and now, get tf array for the input string
-        myArray = buildArray (allDictionaryWordsInThatDoc.top (1)[0][1])
+        myArray = toDense (buildArray (allDictionaryWordsInThatDoc.top (1)[0][1]))
         #
         # now, get the tf * idf array for the input string
         myArray = np.multiply (myArray, idfArray)
         #
-        # now, we get the distance from the input text string to all database documents, using cosine similarity
-        distances = allDocsAsNumpyArrays.map (lambda x : (x[0][1], np.dot (x[1], myArray)))
+        # now, we get the similarity of the input text string to all database documents (a cosine similarity
+        # if useCosineSimilarity is set, since the documents then have unit length)
+        # (each document is sparse, so we only touch the query entries at that document's dictionary positions)
+        distances = allDocsAsNumpyArrays.map (lambda x : (x[0][1], np.dot (x[1][1], myArray[x[1][0]])))
         #
         # get the top k distances
         topK = distances.top (k, lambda x : x[1])
@@ -142,6 +217,62 @@ def getPrediction (textInput, k):
         # and return the best!
         return numTimes.top (1, lambda x: x[1])
 
+# and this returns the predictions for a whole list of strings at once, in input order; type, for example:
+# getPredictions (["god jesus allah", "how many goals Vancouver score last year?"], 30)
+# Rather than one chain of Spark jobs per string, each batch of strings is vectorized together on the driver
+# and broadcast, and then every partition scores its documents against the whole batch with one matrix
+# multiply per block of documents, keeping only its own top k for each string
+def getPredictions (textInputs, k, batchSize=1000):
+        localDictionary = buildDictionaryLookup (topWords)
+        returnVal = []
+        for start in range (0, len (textInputs), batchSize):
+                #
+                # turn this batch of strings into one (numStrings, numWords) matrix over the words they use
+                queryArrays = [vectorize (x, localDictionary, useTF=True, idfArray=idfArray) for x in textInputs[start:start + batchSize]]
+                batch = sc.broadcast (buildQueryMatrix (queryArrays))
+                #
+                # get the top k (score, newsgroupID) pairs for each string within each partition, and merge them
+                topK = allDocsAsNumpyArrays.mapPartitions (lambda x: [scoreDocsTopK (list (x), batch.value[0], batch.value[1], k)]).reduce (lambda x1, x2: mergeTopK (x1, x2, k))
+                #
+                # and, for each string, return the newsgroup that appeared the most times in its top k
+                returnVal.extend (voteTopK (topK[1]))
+                batch.unpersist ()
+        return returnVal
+
+# getPrediction above launches a whole chain of Spark jobs for every single query.  To serve predictions
+# instead, set this to True to snapshot the dictionary and all of the document vectors into a local engine on
+# the driver (see local_engine.py), and then type, for example: localEngine.getPrediction ("god jesus allah", 30)
+# which returns the same kind of answer in pure numpy, with no cluster round-trips.  It is off by default,
+# since it collects every document vector into the driver's memory
+useLocalEngine = False
+
+if useLocalEngine:
+        localEngine = KnnEngine (topWords, allDocsAsNumpyArrays.collect (), useTF=True, idfArray=idfArray)
+
+# set this to True (along with useLocalEngine) to answer localEngine.getPrediction queries approximately,
+# from a locality sensitive hash index (see LshIndex in local_engine.py), rather than by scoring every
+# document.  The index trades accuracy for speed through numTables, numBits and numProbes, and
+# localEngine.lshIndex.recall (["god jesus allah", "how many goals"], 30, localEngine.numProbes)
+# reports the fraction of the exact top 30 that it finds, and how many documents it scored on average
+useApproximateSearch = False
+
+if useApproximateSearch:
+        if not useLocalEngine:
+                raise ValueError ("useApproximateSearch needs the local engine, so useLocalEngine has to be set as well")
+        localEngine.buildLshIndex (numTables=16, numBits=8, numProbes=2)
+
+# set this to a directory name to save everything that was trained above, along with localEngine if
+# useLocalEngine is set, into that directory (see model_store.py).  Then, in any other python process,
+# localEngine = loadKnnEngine (modelDirectory + "/engine")
+# gets the engine back in milliseconds, with its big arrays memory-mapped rather than read in, so that
+# localEngine.getPrediction ("god jesus allah", 30) answers right away
+modelDirectory = None
+
+if modelDirectory is not None:
+        saveArtifacts (modelDirectory, topWords, idfArray=idfArray)
+        if useLocalEngine:
+                saveKnnEngine (localEngine, modelDirectory + "/engine")
+
 #####################################################################################################################
 
 
@@ -0,0 +1,168 @@
+
+#####################################################################################################################
+#
+# A columnar, memory-mapped copy of the 20 newsgroups corpus, so that the text is only ever parsed once.
+#
+# Every run of an Activity script reads 20_news_same_line.txt again, cuts out the docID with x.index ('id="'),
+# x.index ('" url=') and x.index ('">'), tokenizes the whole text, and then pulls the newsgroup out of each
+# docID with the '/.*?/' regular expression.  convertCorpus does all of that one time, and writes the result
+# into a directory as a handful of files, one per column:
+#
+# vocabulary.txt and counts.npy: every distinct word of the corpus (one per line) and its number of
+#     occurrences, most common first (ties in order of first appearance), so that the token ID of a word is its
+#     position here; topWords picks the 20,000 most common words out of these
+# docIDs.npy:                    the docID of every document, such as "20_newsgroups/comp.graphics/37261"
+# labels.npy:                    the newsgroup of every document, as a small integer...
+# newsgroups.npy:                ...that is a position in this list of newsgroupIDs, such as "/comp.graphics/"
+# tokens.npy and offsets.npy:    the token IDs of all of the words of all of the documents, one document after
+#     another, in one int32 array, where the words of document i are tokens[offsets[i]:offsets[i + 1]]
+#
+# A CorpusStore loads all of them memory-mapped, so opening one costs next to nothing, and a document is only
+# read from disk once it is used.  readCorpus turns a store into the same RDD that the Activity scripts build
+# with validLines.map (ingestDocument), except that each document is just its token IDs, keyed by its (docID,
+# newsgroupID) pair: nothing has to be parsed, no word has to be looked up in the dictionary (dictionaryPositions
+# maps every token ID to a dictionary position in one array), and no regular expression has to run.  The
+# partitions each open the store themselves, so the directory has to be where the workers can read it (on every
+# node, or on a shared file system; in local mode, anywhere).  The conversion is run once, from the command line:
+#
+# python corpus_store.py 20_news_same_line.txt newsgroupCorpus
+#
+# and then corpusDirectory = "newsgroupCorpus" at the top of an Activity script makes it read the store.
+#
+#####################################################################################################################
+
+import os
+import re
+import argparse
+import numpy as np
+from ingestion import ingestDocument
+
+# this is the rule that the Activity scripts use to get the newsgroupID out of a docID
+newsgroupRegex = re.compile ('/.*?/')
+
+# the vocabulary is kept as a text file, rather than as a fixed-width array of strings that would pad every
+# word out to the length of the longest one
+columns = ["counts", "docIDs", "labels", "newsgroups", "tokens", "offsets"]
+
+# this converts the lines of 20_news_same_line.txt into a store in the given directory, as described above,
+# and returns the number of documents in it
+def convertCorpus (lines, directory):
+        wordIDs, docIDs, tokens, lengths = {}, [], [], []
+        for line in lines:
+                if 'id' not in line:
+                        continue
+                docID, (words, tokenIDs) = ingestDocument (line)
+                docIDs.append (docID)
+                tokens.append (np.fromiter ((wordIDs.setdefault (j, len (wordIDs)) for j in words), dtype=np.int32, count=len (words))[tokenIDs])
+                lengths.append (len (tokenIDs))
+        tokens = np.concatenate (tokens + [np.zeros (0, dtype=np.int32)])
+        #
+        # the words were numbered in order of first appearance; renumber them from the most common one down,
+        # with ties kept in order of first appearance
+        counts = np.bincount (tokens, minlength=len (wordIDs))
+        order = np.argsort (-counts, kind="stable")
+        rank = np.empty (len (order), dtype=np.int32)
+        rank[order] = np.arange (len (order), dtype=np.int32)
+        newsgroups, labels = np.unique ([newsgroupRegex.search (x).group (0) for x in docIDs], return_inverse=True)
+        os.makedirs (directory, exist_ok=True)
+        words = list (wordIDs)
+        with open (os.path.join (directory, "vocabulary.txt"), "w", encoding="ascii") as f:
+                for i in order:
+                        f.write ("%s\n" % words[i])
+        arrays = {"counts": counts[order], "docIDs": np.array (docIDs, dtype=str), "labels": labels.astype (np.int16),
+                "newsgroups": newsgroups, "tokens": rank[tokens], "offsets": np.concatenate (([0], np.cumsum (lengths, dtype=np.int64)))}
+        for name in columns:
+                np.save (os.path.join (directory, name + ".npy"), arrays[name])
+        return len (docIDs)
+
+class CorpusStore:
+        #
+        # this opens the store in the given directory, with every column memory-mapped read-only by default
+        def __init__ (self, directory, mmapMode="r"):
+                with open (os.path.join (directory, "vocabulary.txt"), encoding="ascii") as f:
+                        self.vocabulary = [line.rstrip ("\n") for line in f]
+                for name in columns:
+                        setattr (self, name, np.load (os.path.join (directory, name + ".npy"), mmap_mode=mmapMode))
+        #
+        def __len__ (self):
+                return len (self.docIDs)
+        #
+        # this returns the (docID, newsgroupID) key of document i
+        def key (self, i):
+                return (str (self.docIDs[i]), str (self.newsgroups[self.labels[i]]))
+        #
+        # and this returns its token IDs, in order
+        def tokenIDs (self, i):
+                return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+        #
+        # this returns the ((docID, newsgroupID), tokenIDs) records of documents start to end - 1, with the token
+        # IDs copied out of the memory map, so that they can be cached or sent back to the driver
+        def documents (self, start=0, end=None):
+                end = len (self) if end is None else end
+                return [(self.key (i), np.array (self.tokenIDs (i))) for i in range (start, end)]
+        #
+        # these are the ("word", count) pairs of the numWords most common words, the same as topWords in the
+        # Activity scripts, in the same order, ties included.  There, allCounts.top keeps words with the same
+        # count in the order that reduceByKey left them in: partition by partition, where a word goes to
+        # partition portable_hash (word) % numPartitions, and within a partition, in order of first appearance
+        # (in local mode, at least; a cluster fetches the map outputs in no fixed order), which is how the
+        # words with the same count are ordered here already.  So numPartitions has to be the number of
+        # partitions that reduceByKey counted the words in (see reducePartitions), and the driver has to hash
+        # strings the way the workers do, which it does whenever PYTHONHASHSEED is set, as pyspark requires
+        def topWords (self, numWords, numPartitions=1):
+                numWords = min (numWords, len (self.counts))
+                if numPartitions == 1 or numWords == 0:
+                        order = range (numWords)
+                else:
+                        from pyspark.rdd import portable_hash
+                        #
+                        # only the words that occur at least as often as the last one can make it in
+                        numCandidates = np.searchsorted (-self.counts, -self.counts[numWords - 1], side="right")
+                        partitions = [portable_hash (word) % numPartitions for word in self.vocabulary[:numCandidates]]
+                        order = np.lexsort ((partitions, -self.counts[:numCandidates]))[:numWords]
+                return [(self.vocabulary[i], int (self.counts[i])) for i in order]
+        #
+        # and this returns an int32 array with the position in topWords (a list of ("word", count) pairs) of the
+        # word of every token ID, or -1 for the words that are not in it, for tokenPositions
+        def dictionaryPositions (self, topWords):
+                tokenIDs = dict ((word, i) for i, word in enumerate (self.vocabulary))
+                returnVal = np.full (len (self.vocabulary), -1, dtype=np.int32)
+                for position, (word, count) in enumerate (topWords):
+                        if word in tokenIDs:
+                                returnVal[tokenIDs[word]] = position
+                return returnVal
+
+# this returns the dictionary positions of the token IDs of a document from a store, in order, as an int32
+# array, dropping every word that is not in the dictionary, given the array from dictionaryPositions
+def tokenPositions (tokenIDs, positions):
+        positions = positions[tokenIDs]
+        return positions[positions >= 0]
+
+# this is the number of partitions that rdd.reduceByKey counts in by default, which is what topWords needs to
+# break ties the same way as allCounts.top does when the words are counted from the text file in rdd
+def reducePartitions (rdd):
+        if rdd.context.getConf ().contains ("spark.default.parallelism"):
+                return rdd.context.defaultParallelism
+        return rdd.getNumPartitions ()
+
+# this reads documents start to end - 1 of the store in the given directory, on a worker
+def readRange (directory, start, end):
+        return CorpusStore (directory).documents (start, end)
+
+# this returns an RDD with one ((docID, newsgroupID), tokenIDs) record per document of the store, in
+# numSlices partitions (sc.defaultParallelism by default) of consecutive documents
+def readCorpus (sc, directory, numSlices=None):
+        numDocs = len (CorpusStore (directory))
+        numSlices = max (1, min (numSlices or sc.defaultParallelism, numDocs))
+        bounds = [numDocs * i // numSlices for i in range (numSlices + 1)]
+        return sc.parallelize (list (zip (bounds[:-1], bounds[1:])), numSlices).flatMap (lambda x: readRange (directory, x[0], x[1]))
+
+if __name__ == "__main__":
+        parser = argparse.ArgumentParser (description="Convert 20_news_same_line.txt into a memory-mapped columnar store.")
+        parser.add_argument ("fileName", help="the corpus, one <doc id=...> line per document")
+        parser.add_argument ("directory", help="the directory to write the store to")
+        args = parser.parse_args ()
+        with open (args.fileName, encoding="utf-8", errors="replace") as f:
+                numDocs = convertCorpus ((line.rstrip ("\r\n") for line in f), args.directory)
+        store = CorpusStore (args.directory)
+        print ("wrote %d documents, %d words, %d distinct words and %d newsgroups to %s" % (numDocs, len (store.tokens), len (store.vocabulary), len (store.newsgroups), args.directory))
@@ -1,4 +1,12 @@
 
+import heapq
+from collections import Counter
+from tokenizer import tokenizeLines
+from local_word_count import countWordsLocal
+
+# countWords3 below splits the lines with the same tokenizer as the Activity scripts, on the workers
+sc.addPyFile ("tokenizer.py")
+
 def countWords (fileName):
 	textfile = sc.textFile(fileName)
 	lines = textfile.flatMap(lambda line: line.split(" "))
@@ -15,6 +23,27 @@ def countWords2 (fileName):
 	aggregatedCounts = counts.reduceByKey (lambda a, b: a + b)
 	return aggregatedCounts.top (200, key=lambda p : p[1])
 
+
+# countWords and countWords2 create one ("word", 1) pair per word of the text, so on a multi-GB input almost
+# all of the time goes into building and shuffling those tuples.  This version counts the words of each
+# partition in a local Counter first, with the tokenizer from tokenizer.py, so that only one ("word", count)
+# pair per distinct word in each partition goes into the shuffle, and then keeps the numWords most common
+# words of each partition of the totals in a bounded heap, so that only numWords pairs per partition ever
+# come back to the driver.  Words shorter than minLength are dropped, as countWords2 does with minLength=2
+def countPartition (lines, minLength):
+	counts = Counter (tokenizeLines (lines))
+	return [(word, count) for word, count in counts.items () if len (word) >= minLength]
+
+def topOfPartition (pairs, numWords):
+	return heapq.nlargest (numWords, pairs, key=lambda p : p[1])
+
+def countWords3 (fileName, numWords=200, minLength=2):
+	textfile = sc.textFile(fileName)
+	counts = textfile.mapPartitions (lambda lines: countPartition (lines, minLength))
+	aggregatedCounts = counts.reduceByKey (lambda a, b: a + b)
+	topCounts = aggregatedCounts.mapPartitions (lambda pairs: topOfPartition (pairs, numWords))
+	return topOfPartition (topCounts.collect (), numWords)
+
 countWords ("s3://chrisjermainebucket/text/Holmes.txt")
 
 countWords ("s3://chrisjermainebucket/text/")
@@ -22,3 +51,15 @@ countWords ("s3://chrisjermainebucket/text/")
 countWords2 ("s3://chrisjermainebucket/text/Holmes.txt")
 
 countWords2 ("s3://chrisjermainebucket/text/")
+
+countWords3 ("s3://chrisjermainebucket/text/Holmes.txt")
+
+countWords3 ("s3://chrisjermainebucket/text/", numWords=1000)
+
+# for files that fit on one machine, such as Holmes.txt, war.txt and dictionary.txt, starting Spark jobs may
+# cost more than the counting itself (python local_word_count.py ... --benchmark measures where Spark starts
+# to win).  countWordsLocal (see local_word_count.py) gives the same results as the function that method
+# names, counted by a pool of processes on this machine instead
+countWordsLocal (["Holmes.txt"], method="countWords")
+
+countWordsLocal (["Holmes.txt", "war.txt", "dictionary.txt"], method="countWords2")
@@ -0,0 +1,45 @@
+
+#####################################################################################################################
+#
+# The idf stage of the Activity scripts: document frequencies and the document count, in one pass.
+#
+# The idf of a word is log (numDocs / df), where df is the number of documents that the word appears in.  The
+# Activity scripts used to hard-code numDocs as 19997.0, the size of the full 20 newsgroups corpus, which
+# silently gives the wrong weights on any other corpus, on a sample, or on one shard of it.  Here every
+# partition counts its own documents while it adds up their df, so numDocs always comes out of the very same
+# pass over the data as dfArray.
+#
+# The result of the stage is the (dfArray, numDocs) pair, with dfArray held as integer counts, rather than
+# the idf itself: the idf of two shards cannot be combined, but their counts simply add up, with
+# mergeDocumentFrequencies, and inverseDocumentFrequencies turns the total into an idfArray at the end.  So
+# the counts of shards that were processed separately, or of a batch of new documents (see
+# incremental_model.py), can be folded into the ones that a model was trained with.
+#
+#####################################################################################################################
+
+import numpy as np
+
+# this returns (dfArray, numDocs) for the (key, indices) pairs in one partition, inside a list so that it can
+# be used directly with mapPartitions, where indices lists the distinct dictionary positions in a document
+def documentFrequenciesOfPartition (rows, numWords):
+        dfArray = np.zeros (numWords, dtype=np.int64)
+        numDocs = 0
+        for key, indices in rows:
+                dfArray[indices] = dfArray[indices] + 1
+                numDocs = numDocs + 1
+        return [(dfArray, numDocs)]
+
+# this adds up two (dfArray, numDocs) pairs, from two partitions, or two shards of a corpus
+def mergeDocumentFrequencies (x1, x2):
+        return (np.add (x1[0], x2[0]), x1[1] + x2[1])
+
+# and this returns (dfArray, numDocs) for a whole RDD of (key, indices) pairs
+def computeDocumentFrequencies (rdd, numWords, treeDepth=None):
+        partials = rdd.mapPartitions (lambda x: documentFrequenciesOfPartition (x, numWords))
+        if treeDepth is None:
+                return partials.reduce (mergeDocumentFrequencies)
+        return partials.treeReduce (mergeDocumentFrequencies, depth=treeDepth)
+
+# this gets the version of dfArray where the i^th entry is the inverse-document frequency for the i^th word
+def inverseDocumentFrequencies (dfArray, numDocs):
+        return np.log (np.divide (float (numDocs), dfArray))
@@ -0,0 +1,93 @@
+
+#####################################################################################################################
+#
+# Folding new documents into a trained regression model, without rerunning the Activity script.
+#
+# Everything that Activity11.py learns from the corpus comes down to a handful of sums over the documents:
+# the document frequency of every dictionary word (dfArray), the number of documents (numDocs), and, for the
+# regression, X^T X and X^T y, where X holds the 1000-dimensional vectors and y the labels.  Each of these is
+# a plain sum, so a batch of new documents can simply be added to it, and the normal equations can then be
+# solved again on the driver (see normal_equations.py).  That costs the number of new documents times
+# 1000 * 1000 for the update, plus one 1000 by 1000 solve, no matter how big the corpus already is.  For
+# example, at the end of Activity11.py:
+#
+# incrementalModel.addDocuments ([(("20_newsgroups/alt.atheism/99999", "/alt.atheism/"), "text of the post")], allLabels)
+# localEngine = incrementalModel.regressionEngine ()
+#
+# Two things stay fixed between full runs.  The dictionary (topWords) does not change, so words that are not
+# in it are ignored, just as they are in getPrediction.  And the new documents are weighted with the idf
+# that the model was trained with, since the rows already summed into X^T X cannot be re-weighted; dfArray
+# and numDocs are still kept up to date, and idfDrift reports how far the idf has moved away from the one
+# in use, which tells when it is time to rerun the whole script.
+#
+#####################################################################################################################
+
+import numpy as np
+from local_engine import RegressionEngine, NewsgroupEngine, buildDictionaryLookup, vectorize
+from normal_equations import normalEquationsOfPartition, solveNormalEquations
+from document_frequencies import inverseDocumentFrequencies
+
+class IncrementalModel:
+        #
+        # dfArray, numDocs, gramMatrix and xTransposeY are the sums over the documents that the model has seen so
+        # far, projection is the RandomProjection (see projections.py) that the vectors were mapped down with,
+        # and idfArray is the idf that they were weighted with, which is log (numDocs / dfArray) if not given.
+        # xTransposeY is a matrix with one column per target if the model has several of them
+        def __init__ (self, topWords, dfArray, numDocs, projection, gramMatrix, xTransposeY, idfArray=None, ridge=0.0, method="cholesky"):
+                self.topWords = list (topWords)
+                self.dictionaryLookup = buildDictionaryLookup (self.topWords)
+                self.dfArray = np.array (dfArray, dtype=np.float64)
+                self.numDocs = numDocs
+                self.projection = projection
+                self.gramMatrix = np.array (gramMatrix, dtype=np.float64)
+                self.xTransposeY = np.array (xTransposeY, dtype=np.float64)
+                self.idfArray = inverseDocumentFrequencies (self.dfArray, numDocs) if idfArray is None else np.array (idfArray)
+                self.ridge = ridge
+                self.method = method
+                self.params = self.solve ()
+
+        # this solves the normal equations for the documents seen so far
+        def solve (self):
+                return solveNormalEquations (self.gramMatrix, self.xTransposeY, ridge=self.ridge, method=self.method)
+
+        # this adds sums that were built somewhere else (say, by a Spark job over a new shard of the corpus,
+        # with the same dictionary, idfArray and projection) into the model, and solves it again
+        def addStatistics (self, dfArray, numDocs, gramMatrix, xTransposeY):
+                self.dfArray = self.dfArray + dfArray
+                self.numDocs = self.numDocs + numDocs
+                self.gramMatrix = self.gramMatrix + gramMatrix
+                self.xTransposeY = self.xTransposeY + xTransposeY
+                self.params = self.solve ()
+                return self.params
+
+        # this folds a batch of (key, text) pairs into the model, where labelOf maps each key to its label (or
+        # to its row of labels), and returns the new regression parameters.  Just as in the Activity scripts, a
+        # document with no dictionary words at all is dropped, and is not even counted in numDocs
+        def addDocuments (self, documents, labelOf):
+                dfArray, numDocs, rows = np.zeros (len (self.dfArray)), 0, []
+                for key, textInput in documents:
+                        indices, values = vectorize (textInput, self.dictionaryLookup, useTF=True)
+                        if len (indices) > 0:
+                                dfArray[indices] = dfArray[indices] + 1
+                                numDocs = numDocs + 1
+                                rows.append ((key, self.projection.project ((indices, np.multiply (values, self.idfArray[indices])))))
+                numTargets = None if self.xTransposeY.ndim == 1 else self.xTransposeY.shape[1]
+                gramMatrix, xTransposeY = normalEquationsOfPartition (rows, len (self.gramMatrix), labelOf, numTargets=numTargets)[0]
+                return self.addStatistics (dfArray, numDocs, gramMatrix, xTransposeY)
+
+        # this is the idf that a full rerun over all of the documents seen so far would use
+        def currentIdfArray (self):
+                return np.log (np.divide (self.numDocs, np.maximum (self.dfArray, 1)))
+
+        # and this is the largest difference between that and the idf that the model is using
+        def idfDrift (self):
+                return np.max (np.abs (self.currentIdfArray () - self.idfArray))
+
+        # these snapshot the current model into the local engines of local_engine.py; with several targets, the
+        # first column is the religion model and the rest are the newsgroup models, as in Activity11.py
+        def regressionEngine (self):
+                regressionParams = self.params if self.params.ndim == 1 else self.params[:, 0]
+                return RegressionEngine (self.topWords, self.idfArray, self.projection.matrix (), regressionParams)
+
+        def newsgroupEngine (self, newsgroupNames):
+                return NewsgroupEngine (self.topWords, self.idfArray, self.projection.matrix (), self.params[:, 1:], newsgroupNames)
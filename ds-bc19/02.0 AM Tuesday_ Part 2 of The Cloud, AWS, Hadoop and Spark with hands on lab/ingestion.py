@@ -0,0 +1,48 @@
+
+#####################################################################################################################
+#
+# Reading the 20 newsgroups corpus in a single pass.
+#
+# Each line of 20_news_same_line.txt looks like <doc id="20_newsgroups/comp.graphics/37261" url="..."> text...
+# The functions here parse such a line and split its text into words exactly once, with the tokenizer of
+# tokenizer.py, and keep the result in a compact token-ID form: for each document, a list of its distinct
+# words, in order of first appearance, and an int32 array with one entry per word of the text that gives that
+# word's position in the list.  So the text "the cat saw the dog" becomes (["the", "cat", "saw", "dog"],
+# [0, 1, 2, 0, 3]).  Each distinct word is stored (and later looked up in the dictionary) once per document
+# rather than once per occurrence, and nothing is lost, since the words of the text can always be read back
+# off as words[tokenIDs].
+#
+# The Activity scripts map every line through ingestDocument and cache the result, so that counting the
+# vocabulary, looking up the dictionary positions and building the vectors never go back to the raw text.
+#
+#####################################################################################################################
+
+import numpy as np
+from tokenizer import tokenize
+
+# this takes one line of the corpus and returns (docID, (words, tokenIDs)), as described above
+def ingestDocument (line):
+        docID = line[line.index ('id="') + 4 : line.index ('" url=')]
+        text = tokenize (line[line.index ('">') + 2:])
+        positions = {}
+        tokenIDs = np.fromiter ((positions.setdefault (j, len (positions)) for j in text), dtype=np.int32, count=len (text))
+        return (docID, (list (positions), tokenIDs))
+
+# this returns a ("word", count) pair for each distinct word of an ingested document... summing these over
+# all documents gives the same totals as emitting ("word", 1) once per occurrence, with far fewer records
+def wordCounts (document):
+        words, tokenIDs = document
+        return zip (words, np.bincount (tokenIDs, minlength=len (words)).tolist ())
+
+# this returns all the words of an ingested document, in order, just as the text was split
+def allTokens (document):
+        words, tokenIDs = document
+        return [words[j] for j in tokenIDs]
+
+# and this returns the dictionary positions of the words of an ingested document, in order, as an int32
+# array, dropping every word that is not in the dictionary; each distinct word is looked up only once
+def dictionaryPositions (document, dictionaryLookup):
+        words, tokenIDs = document
+        positions = np.fromiter ((dictionaryLookup.get (j, -1) for j in words), dtype=np.int32, count=len (words))
+        positions = positions[tokenIDs]
+        return positions[positions >= 0]
@@ -0,0 +1,476 @@
+
+#####################################################################################################################
+#
+# Local, in-process serving for the 20 newsgroups classifiers.
+#
+# The getPrediction functions in Activity5.py, Activity6Answer.py, Activity7Answer.py and Activity11.py push the
+# query string out into the cloud and then run a join, a groupByKey, a top and an aggregateByKey over it, which
+# costs seconds of latency to classify one short string.  The engines in this file take a snapshot of a trained
+# model (the dictionary and idfArray, plus either the document vectors for kNN or the mappingMatrix and the
+# regressionParams for the linear model) and answer the same queries on the driver, in pure numpy, with no
+# cluster round-trips at all.  For example, at the end of Activity7Answer.py:
+#
+# localEngine = KnnEngine (topWords, allDocsAsNumpyArrays.collect (), useTF=True, idfArray=idfArray)
+# localEngine.getPrediction ("god jesus allah", 30)
+# localEngine.getPredictions (["god jesus allah", "how many goals Vancouver score last year?"], 30)
+#
+# and at the end of Activity11.py:
+#
+# localEngine = RegressionEngine (topWords, idfArray, mappingMatrix, regressionParams)
+# localEngine.getPrediction ("god jesus allah")
+# newsgroupEngine = NewsgroupEngine (topWords, idfArray, mappingMatrix, newsgroupParams, newsgroupNames)
+# newsgroupEngine.getPrediction ("god jesus allah")
+#
+#####################################################################################################################
+
+import numpy as np
+from tokenizer import encodeTokens
+
+# this turns topWords, a list of ("word", count) pairs with the most common word first, into a hash table
+# that maps "mostcommonword" to 0, "nextmostcommon" to 1, and so on
+def buildDictionaryLookup (topWords):
+        return dict ((topWords[x][0], x) for x in range (len (topWords)))
+
+# this maps a string to a sparse (indices, values) vector over the dictionary, exactly the way buildArray
+# does it in the Activity scripts: values holds the number of times each dictionary word occurs, divided by
+# the total number of dictionary words in the string if useTF is set, and then multiplied by the idf of
+# each word if an idfArray is given
+def vectorize (textInput, dictionaryLookup, useTF=False, idfArray=None):
+        indices, counts = np.unique (encodeTokens (textInput, dictionaryLookup), return_counts=True)
+        values = counts.astype (np.float64)
+        if useTF and len (values) > 0:
+                values = np.divide (values, np.sum (values))
+        if idfArray is not None:
+                values = np.multiply (values, idfArray[indices])
+        return (indices, values)
+
+# this scales a sparse (indices, values) vector to unit length, so that the dot product of two such vectors is
+# their cosine similarity; the all-zero vector is left as it is
+def normalizeArray (sparseArray):
+        norm = np.sqrt (np.dot (sparseArray[1], sparseArray[1]))
+        if norm == 0:
+                return sparseArray
+        return (sparseArray[0], np.divide (sparseArray[1], norm))
+
+# this returns the positions of the k largest entries of scores, in no particular order... it is a partial
+# selection, so it costs time linear in the number of scores rather than a full sort
+def topKIndices (scores, k):
+        if k >= len (scores):
+                return np.arange (len (scores))
+        return np.argpartition (-scores, k - 1)[:k]
+
+#####################################################################################################################
+#
+# Batch scoring.  Rather than scoring texts one at a time, a whole batch of query vectors is stacked into a
+# dense matrix with one row per query and one column per dictionary word that occurs anywhere in the batch,
+# and is then scored against a block of documents laid out the same way with a single matrix multiply.
+#
+#####################################################################################################################
+
+# this stacks a list of sparse (indices, values) vectors into a dense matrix with one row per vector, keeping
+# only the dictionary positions listed in columns (a sorted array)... the j^th column of the result holds
+# dictionary position columns[j], and any other dictionary position is simply dropped
+def stackSparseArrays (sparseArrays, columns):
+        returnVal = np.zeros ((len (sparseArrays), len (columns)))
+        if len (columns) == 0:
+                return returnVal
+        rows = np.repeat (np.arange (len (sparseArrays)), [len (x[0]) for x in sparseArrays])
+        indices = np.concatenate ([np.asarray (x[0], dtype=np.int32) for x in sparseArrays] + [np.zeros (0, dtype=np.int32)])
+        values = np.concatenate ([np.asarray (x[1], dtype=np.float64) for x in sparseArrays] + [np.zeros (0)])
+        positions = np.minimum (np.searchsorted (columns, indices), len (columns) - 1)
+        keep = columns[positions] == indices
+        returnVal[rows[keep], positions[keep]] = values[keep]
+        return returnVal
+
+# this gets the union of the dictionary positions used by a batch of sparse query vectors, along with the
+# (numQueries, numColumns) query matrix over those positions
+def buildQueryMatrix (queryArrays):
+        columns = np.unique (np.concatenate ([np.asarray (x[0], dtype=np.int32) for x in queryArrays] + [np.zeros (0, dtype=np.int32)]))
+        return (columns, stackSparseArrays (queryArrays, columns))
+
+# scores is a (numQueries, numCandidates) matrix and labels is a matching matrix of newsgroups; this keeps
+# only the k highest scoring candidates (and their labels) in each row
+def selectTopK (scores, labels, k):
+        if scores.shape[1] <= k:
+                return (scores, labels)
+        best = np.argpartition (-scores, k - 1, axis=1)[:, :k]
+        return (np.take_along_axis (scores, best, axis=1), np.take_along_axis (labels, best, axis=1))
+
+# this merges two (scores, labels) pairs produced by selectTopK into the overall top k for each query
+def mergeTopK (topK1, topK2, k):
+        return selectTopK (np.concatenate ((topK1[0], topK2[0]), axis=1), np.concatenate ((topK1[1], topK2[1]), axis=1), k)
+
+# this scores a list of ((docID, newsgroupID), (indices, values)) documents against a query matrix from
+# buildQueryMatrix, blockSize documents (one matrix multiply) at a time, and returns the top k
+# (scores, newsgroupIDs) for every query... it is run over each partition of allDocsAsNumpyArrays by the
+# getPredictions functions in the kNN Activity scripts
+def scoreDocsTopK (docs, columns, queryMatrix, k, blockSize=1024):
+        topK = (np.zeros ((len (queryMatrix), 0)), np.zeros ((len (queryMatrix), 0), dtype=object))
+        for start in range (0, len (docs), blockSize):
+                block = docs[start:start + blockSize]
+                docMatrix = stackSparseArrays ([x[1] for x in block], columns)
+                scores = np.dot (queryMatrix, docMatrix.T)
+                labels = np.empty (len (block), dtype=object)
+                labels[:] = [x[0][1] for x in block]
+                topK = mergeTopK (topK, (scores, np.broadcast_to (labels, scores.shape)), k)
+        return topK
+
+# and this turns the top k newsgroupIDs for each query into a [(newsgroupID, count)] answer for each query,
+# picking the newsgroup that appears most often, just as getPrediction does
+def voteTopK (labels):
+        returnVal = []
+        for row in labels:
+                numTimes = {}
+                for label in row:
+                        numTimes[label] = numTimes.get (label, 0) + 1
+                best = max (numTimes, key=numTimes.get) if numTimes else None
+                returnVal.append ([(best, numTimes.get (best, 0))])
+        return returnVal
+
+#####################################################################################################################
+#
+# kNN classifier.  The documents are stored twice.  First, grouped by dictionary position: for each word,
+# the list of documents that contain it along with the value of that word in each document, sorted from the
+# largest value to the smallest.  Second, one document after another, so that the exact score of any single
+# document can be computed directly.  A top k search only ever reads the lists of the query's words, and
+# picks how from their lengths (see searchTopK): a one-word query is answered straight from the top of its
+# list, and, in a large corpus, a query of rare words from the few documents that they touch, so neither
+# costs anything per document in the corpus; every other query costs a pass over a score array as long as
+# the corpus.
+#
+#####################################################################################################################
+
+class KnnEngine:
+        #
+        # topWords is the list of ("word", count) pairs that defines the dictionary, docs is a list of
+        # ((docID, newsgroupID), (indices, values)) pairs as collected from allDocsAsNumpyArrays, and useTF and
+        # idfArray say how a query string has to be turned into a vector to be comparable with those documents
+        def __init__ (self, topWords, docs, useTF=False, idfArray=None):
+                self.dictionaryLookup = buildDictionaryLookup (topWords)
+                self.useTF = useTF
+                self.idfArray = idfArray
+                #
+                # remember the docID of each document, and its newsgroup as a small integer
+                self.docIDs = [x[0][0] for x in docs]
+                self.labelNames, self.docLabels = np.unique ([x[0][1] for x in docs], return_inverse=True)
+                #
+                # first, lay out all of the (dictionaryPos, value) pairs one document after another; the
+                # j^th document is then docIndices[docStarts[j]:docStarts[j + 1]] and the matching docValues
+                numWords = len (self.dictionaryLookup)
+                docs = [x[1] for x in docs]
+                lengths = [len (x[0]) for x in docs]
+                rows = np.repeat (np.arange (len (docs), dtype=np.int32), lengths)
+                cols = np.concatenate ([np.asarray (x[0], dtype=np.int32) for x in docs] + [np.zeros (0, dtype=np.int32)])
+                vals = np.concatenate ([np.asarray (x[1], dtype=np.float64) for x in docs] + [np.zeros (0)])
+                self.docStarts = np.concatenate (([0], np.cumsum (lengths, dtype=np.int64)))
+                self.docIndices = cols
+                self.docValues = vals
+                #
+                # and then sort the very same triples by dictionaryPos, and by decreasing value within each
+                # dictionaryPos; the documents that contain the i^th dictionary word, best first, are then
+                # postingDocs[postingStarts[i]:postingStarts[i + 1]]
+                order = np.lexsort ((-vals, cols))
+                self.postingDocs = rows[order]
+                self.postingValues = vals[order]
+                self.postingStarts = np.concatenate (([0], np.cumsum (np.bincount (cols, minlength=numWords))))
+                #
+                # there is no approximate (LSH) index until buildLshIndex is called
+                self.lshIndex = None
+        #
+        # this turns a query string into a sparse vector that is comparable with the stored documents
+        def vectorize (self, textInput):
+                return vectorize (textInput, self.dictionaryLookup, self.useTF, self.idfArray)
+        #
+        # this computes the dot product of a sparse query vector with every stored document, by walking
+        # the list of documents for each word in the query and accumulating into a single score array
+        def score (self, queryArray):
+                scores = np.zeros (len (self.docIDs))
+                for index, value in zip (queryArray[0], queryArray[1]):
+                        start, end = self.postingStarts[index], self.postingStarts[index + 1]
+                        scores[self.postingDocs[start:end]] += value * self.postingValues[start:end]
+                return scores
+        #
+        # this computes the exact dot product of a dense query vector with each of the listed documents,
+        # using the one-document-after-another layout
+        def scoreDocs (self, docs, queryDense):
+                lengths = self.docStarts[docs + 1] - self.docStarts[docs]
+                positions = np.repeat (self.docStarts[docs] - np.cumsum (lengths) + lengths, lengths) + np.arange (np.sum (lengths))
+                products = np.multiply (self.docValues[positions], queryDense[self.docIndices[positions]])
+                return np.bincount (np.repeat (np.arange (len (docs)), lengths), weights=products, minlength=len (docs))
+        #
+        # this returns the positions of the k documents with the largest dot product with a sparse query vector,
+        # along with their scores, best first, by scoring every document with score; this is the baseline that
+        # the shortcuts in searchTopK have to beat
+        def scanTopK (self, queryArray, k):
+                scores = self.score (queryArray)
+                best = topKIndices (scores, k)
+                best = best[np.argsort (-scores[best], kind='stable')]
+                return (best, scores[best])
+        #
+        # if fewer than k documents share a word with the query, the rest of the top k all score zero; this
+        # fills the (docs, scores) of the ones that do up to k with documents that do not
+        def padTopK (self, docs, scores, k):
+                if len (docs) >= k:
+                        return (docs, scores)
+                others = np.ones (len (self.docIDs), dtype=bool)
+                others[docs] = False
+                padding = np.flatnonzero (others)[:k - len (docs)]
+                return (np.concatenate ((docs, padding)), np.concatenate ((scores, np.zeros (len (padding)))))
+        #
+        # and this returns the same top k as scanTopK, picking the cheapest way to get it from the lengths of the
+        # lists of the query's words.  A single word needs no search at all: its list is sorted from the largest
+        # value down, so its top k are the first k entries.  When the corpus has at least minSparseDocs documents
+        # and all of the lists together hold fewer than one entry per sparseRatio documents, the entries are
+        # added up per document over just the documents that they touch, which saves clearing and selecting
+        # from a score for every document (below about 40000 documents the score array is small enough that
+        # this does not pay for the sort it needs).  Anything else is scanned, which costs one pass over the
+        # lists plus two over a score array as long as the corpus, and is decided first so that it costs nothing
+        # extra.  Both shortcuts need all of the values to be non-negative (so that a document that is in no
+        # list, with a score of zero, can never beat one that is), which they are for counts, tf and tf * idf
+        # vectors; each list is sorted from the largest value down, so it is enough to check the last entry of
+        # each one that is not empty
+        def searchTopK (self, queryArray, k, sparseRatio=32, minSparseDocs=40000):
+                indices, values = queryArray
+                numDocs = len (self.docIDs)
+                k = min (k, numDocs)
+                if len (indices) != 1 and numDocs < minSparseDocs:
+                        return self.scanTopK (queryArray, k)
+                starts, ends = self.postingStarts[indices], self.postingStarts[indices + 1]
+                lengths = ends - starts
+                if len (indices) != 1 and np.sum (lengths) * sparseRatio >= numDocs:
+                        return self.scanTopK (queryArray, k)
+                if np.any (values < 0) or np.any (self.postingValues[ends[lengths > 0] - 1] < 0):
+                        return self.scanTopK (queryArray, k)
+                if len (indices) == 1:
+                        end = min (ends[0], starts[0] + k)
+                        return self.padTopK (self.postingDocs[starts[0]:end], values[0] * self.postingValues[starts[0]:end], k)
+                positions = np.repeat (starts - np.cumsum (lengths) + lengths, lengths) + np.arange (np.sum (lengths))
+                docs, inverse = np.unique (self.postingDocs[positions], return_inverse=True)
+                scores = np.bincount (inverse, weights=np.repeat (values, lengths) * self.postingValues[positions], minlength=len (docs))
+                best = topKIndices (scores, k)
+                best = best[np.argsort (-scores[best], kind='stable')]
+                return self.padTopK (docs[best], scores[best], k)
+        #
+        # this turns on the approximate search mode (see LshIndex below), with numTables hash tables of
+        # numBits bits each, probing numProbes extra buckets per table; the Gaussian projections come from
+        # mappingMatrix if one is given
+        def buildLshIndex (self, numTables=16, numBits=8, mappingMatrix=None, numProbes=2):
+                self.lshIndex = LshIndex (self, numTables, numBits, mappingMatrix)
+                self.numProbes = numProbes
+                return self.lshIndex
+        #
+        # this returns the prediction for the label of a string, in the same [(newsgroupID, count)] form
+        # as getPrediction in the Activity scripts; once buildLshIndex has been called, only the documents
+        # that share a hash bucket with the string are scored, unless approximate is set to False... if no
+        # document shares a bucket with it at all, it falls back to the exact search rather than voting over
+        # nothing
+        def getPrediction (self, textInput, k, approximate=True):
+                queryArray = self.vectorize (textInput)
+                topK = np.zeros (0, dtype=np.int64)
+                if approximate and self.lshIndex is not None:
+                        topK = self.lshIndex.searchTopK (queryArray, k, self.numProbes)[0]
+                if len (topK) == 0:
+                        topK = self.searchTopK (queryArray, k)[0]
+                numTimes = np.bincount (self.docLabels[topK], minlength=len (self.labelNames))
+                best = np.argmax (numTimes)
+                return [(str (self.labelNames[best]), int (numTimes[best]))]
+        #
+        # this gets the documents' values for the dictionary positions listed in columns, as a dense
+        # (numDocs, len (columns)) matrix, straight from the lists of documents for each of those words
+        def docColumns (self, columns):
+                returnVal = np.zeros ((len (self.docIDs), len (columns)))
+                for j, index in enumerate (columns):
+                        start, end = self.postingStarts[index], self.postingStarts[index + 1]
+                        returnVal[self.postingDocs[start:end], j] = self.postingValues[start:end]
+                return returnVal
+        #
+        # this computes the dot product of every query in a list of sparse query vectors with every stored
+        # document, giving a (numDocs, numQueries) matrix; the work is done as one matrix multiply for every
+        # columnBlock dictionary words used by the batch
+        def scoreBatch (self, queryArrays, columnBlock=512):
+                columns, queryMatrix = buildQueryMatrix (queryArrays)
+                scores = np.zeros ((len (self.docIDs), len (queryArrays)))
+                for start in range (0, len (columns), columnBlock):
+                        docMatrix = self.docColumns (columns[start:start + columnBlock])
+                        scores += np.dot (docMatrix, queryMatrix[:, start:start + columnBlock].T)
+                return scores
+        #
+        # this returns the predictions for a whole list of strings, in input order, each in the same
+        # [(newsgroupID, count)] form as getPrediction; the strings are scored batchSize at a time
+        def getPredictions (self, textInputs, k, batchSize=256):
+                returnVal = []
+                for start in range (0, len (textInputs), batchSize):
+                        scores = self.scoreBatch ([self.vectorize (x) for x in textInputs[start:start + batchSize]])
+                        if k < len (scores):
+                                topK = np.argpartition (-scores, k - 1, axis=0)[:k]
+                        else:
+                                topK = np.repeat (np.arange (len (scores))[:, None], scores.shape[1], axis=1)
+                        labels = self.labelNames.astype (object)[self.docLabels[topK]]
+                        returnVal.extend (voteTopK (labels.T))
+                return returnVal
+
+#####################################################################################################################
+#
+# Approximate kNN search with sign random projection LSH.  Each hash table takes numBits Gaussian random
+# projections (the same kind of N (0, 1) matrix that Activity8Answer.py to Activity11.py use as mappingMatrix)
+# and files every document under the numBits-bit key made of the signs of its projections.  Two vectors land
+# under the same key with a probability that drops quickly with the angle between them, so the documents that
+# share a key with the query in at least one table make up a short list of likely neighbours, and only those
+# candidates are scored exactly.  More bits make the buckets smaller (faster, lower recall) and more tables
+# find more of the true neighbours (slower, higher recall); recall reports how well a setting does.
+#
+#####################################################################################################################
+
+class LshIndex:
+        #
+        # engine is the KnnEngine whose documents are indexed; the projections are the first
+        # numTables * numBits columns of mappingMatrix if it is given, and freshly sampled otherwise
+        def __init__ (self, engine, numTables=16, numBits=8, mappingMatrix=None, blockSize=256):
+                if numBits > 62:
+                        raise ValueError ("numBits has to fit in a 64-bit key, but got %d" % numBits)
+                numWords = len (engine.postingStarts) - 1
+                if mappingMatrix is None:
+                        mappingMatrix = np.random.randn (numWords, numTables * numBits)
+                if mappingMatrix.shape[0] != numWords or mappingMatrix.shape[1] < numTables * numBits:
+                        raise ValueError ("mappingMatrix has to have %d rows and at least %d columns (numTables * numBits), but got shape %r" % (numWords, numTables * numBits, mappingMatrix.shape))
+                self.engine = engine
+                self.numTables = numTables
+                self.numBits = numBits
+                self.projections = np.ascontiguousarray (mappingMatrix[:, :numTables * numBits])
+                #
+                # get every document's key in every table, blockSize documents at a time
+                numDocs = len (engine.docIDs)
+                keys = np.zeros ((numTables, numDocs), dtype=np.int64)
+                for start in range (0, numDocs, blockSize):
+                        docs = np.arange (start, min (start + blockSize, numDocs))
+                        first, last = engine.docStarts[docs[0]], engine.docStarts[docs[-1] + 1]
+                        contributions = engine.docValues[first:last, None] * self.projections[engine.docIndices[first:last]]
+                        nonEmpty = engine.docStarts[docs + 1] > engine.docStarts[docs]
+                        projected = np.zeros ((len (docs), self.projections.shape[1]))
+                        if np.any (nonEmpty):
+                                projected[nonEmpty] = np.add.reduceat (contributions, engine.docStarts[docs[nonEmpty]] - first, axis=0)
+                        keys[:, docs] = self.hashKeys (projected)
+                #
+                # and for each table, sort the documents by key, so a bucket is one contiguous run
+                self.bucketDocs = np.argsort (keys, axis=1, kind='stable')
+                self.bucketKeys = np.take_along_axis (keys, self.bucketDocs, axis=1)
+        #
+        # this turns a (numVectors, numTables * numBits) matrix of projections into a (numTables, numVectors)
+        # matrix of keys, where bit b of a key is set if the matching projection is positive
+        def hashKeys (self, projected):
+                bits = (projected > 0).reshape (len (projected), self.numTables, self.numBits)
+                return np.dot (bits, np.left_shift (np.int64 (1), np.arange (self.numBits, dtype=np.int64))).T
+        #
+        # this returns the positions of all the documents that share a bucket with a sparse query vector in
+        # at least one of the tables.  With numProbes > 0, each table also looks in the numProbes buckets
+        # whose keys differ from the query's in exactly one of the bits that the query was closest to
+        # flipping (the projections nearest zero), which finds more neighbours without more tables
+        def candidates (self, queryArray, numProbes=0):
+                indices, values = queryArray
+                projected = np.dot (values, self.projections[indices])[None, :]
+                queryKeys = self.hashKeys (projected)[:, 0]
+                closest = np.argsort (np.abs (projected.reshape (self.numTables, self.numBits)), axis=1)[:, :numProbes]
+                found = []
+                for table in range (self.numTables):
+                        probeKeys = np.concatenate (([queryKeys[table]], np.bitwise_xor (queryKeys[table], np.left_shift (np.int64 (1), closest[table]))))
+                        lo = np.searchsorted (self.bucketKeys[table], probeKeys, side='left')
+                        hi = np.searchsorted (self.bucketKeys[table], probeKeys, side='right')
+                        found.extend (self.bucketDocs[table, a:b] for a, b in zip (lo, hi))
+                return np.unique (np.concatenate (found))
+        #
+        # this is the approximate version of KnnEngine.searchTopK: it scores only the candidates exactly, and
+        # so may return fewer than k documents if the buckets are small
+        def searchTopK (self, queryArray, k, numProbes=0):
+                docs = self.candidates (queryArray, numProbes)
+                queryDense = np.zeros (len (self.projections))
+                queryDense[queryArray[0]] = queryArray[1]
+                scores = self.engine.scoreDocs (docs, queryDense)
+                best = topKIndices (scores, k)
+                best = best[np.argsort (-scores[best], kind='stable')]
+                return (docs[best], scores[best])
+        #
+        # and this reports how good the approximation is for a list of strings: the average fraction of the
+        # exact top k that the approximate search also finds, along with the average number of documents
+        # that had to be scored per string
+        def recall (self, textInputs, k, numProbes=0):
+                found, scored = 0.0, 0
+                for textInput in textInputs:
+                        queryArray = self.engine.vectorize (textInput)
+                        exact = self.engine.searchTopK (queryArray, k)[0]
+                        approximate = self.searchTopK (queryArray, k, numProbes)[0]
+                        found = found + len (np.intersect1d (exact, approximate)) / max (len (exact), 1)
+                        scored = scored + len (self.candidates (queryArray, numProbes))
+                return (found / len (textInputs), scored / len (textInputs))
+
+#####################################################################################################################
+#
+# Linear regression classifier.  Since the tf * idf weighting, the random projection and the dot product with
+# the regression coefficients are all linear, they are folded together into one weight per dictionary word
+# when the engine is built, and a query then costs one multiply-add per dictionary word in the string.
+#
+#####################################################################################################################
+
+class RegressionEngine:
+        #
+        # topWords is the list of ("word", count) pairs that defines the dictionary, and the rest are the
+        # arrays of the same name in Activity11.py
+        def __init__ (self, topWords, idfArray, mappingMatrix, regressionParams):
+                self.dictionaryLookup = buildDictionaryLookup (topWords)
+                self.idfArray = idfArray
+                self.mappingMatrix = mappingMatrix
+                self.regressionParams = regressionParams
+                #
+                # the i^th entry of termWeights is what one unit of tf for the i^th dictionary word adds to
+                # np.dot (reducedRep, regressionParams)
+                self.termWeights = np.multiply (idfArray, np.dot (mappingMatrix, regressionParams))
+        #
+        # this returns the raw regression output for a string; positive means "about religion"
+        def score (self, textInput):
+                indices, values = vectorize (textInput, self.dictionaryLookup, useTF=True)
+                return np.dot (values, self.termWeights[indices])
+        #
+        # and this returns the prediction for the label of a string, just like getPrediction in Activity11.py
+        def getPrediction (self, textInput):
+                return "about religion" if self.score (textInput) > 0 else "not about religion"
+        #
+        # this returns the predictions for a whole list of strings, in input order... all of the strings are
+        # vectorized at once and scored with a single matrix-vector product against termWeights
+        def getPredictions (self, textInputs):
+                columns, queryMatrix = buildQueryMatrix ([vectorize (x, self.dictionaryLookup, useTF=True) for x in textInputs])
+                results = np.dot (queryMatrix, self.termWeights[columns])
+                return ["about religion" if x > 0 else "not about religion" for x in results]
+
+#####################################################################################################################
+#
+# Multi-class linear classifier.  This is the same idea as RegressionEngine, but with one column of regression
+# coefficients per newsgroup (a one-vs-rest model for each of them, all trained together in Activity11.py),
+# so every dictionary word gets one weight per newsgroup, and a query costs a single product of its sparse
+# tf vector with that (numWords, numNewsgroups) matrix, followed by an argmax.
+#
+#####################################################################################################################
+
+class NewsgroupEngine:
+        #
+        # newsgroupParams is a (1000, numNewsgroups) matrix whose j^th column holds the regression coefficients
+        # for the newsgroup called newsgroupNames[j]
+        def __init__ (self, topWords, idfArray, mappingMatrix, newsgroupParams, newsgroupNames):
+                self.dictionaryLookup = buildDictionaryLookup (topWords)
+                self.idfArray = idfArray
+                self.mappingMatrix = mappingMatrix
+                self.newsgroupParams = newsgroupParams
+                self.newsgroupNames = np.array (newsgroupNames)
+                self.termWeights = np.multiply (idfArray[:, None], np.dot (mappingMatrix, newsgroupParams))
+        #
+        # this returns the regression output of every newsgroup for a string
+        def scores (self, textInput):
+                indices, values = vectorize (textInput, self.dictionaryLookup, useTF=True)
+                return np.dot (values, self.termWeights[indices])
+        #
+        # and this returns the name of the newsgroup with the highest output
+        def getPrediction (self, textInput):
+                return str (self.newsgroupNames[np.argmax (self.scores (textInput))])
+        #
+        # this returns the predictions for a whole list of strings, in input order, from one matrix product
+        def getPredictions (self, textInputs):
+                columns, queryMatrix = buildQueryMatrix ([vectorize (x, self.dictionaryLookup, useTF=True) for x in textInputs])
+                return [str (x) for x in self.newsgroupNames[np.argmax (np.dot (queryMatrix, self.termWeights[columns]), axis=1)]]
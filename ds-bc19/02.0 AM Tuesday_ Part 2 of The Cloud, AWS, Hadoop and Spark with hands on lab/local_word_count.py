@@ -0,0 +1,184 @@
+
+#####################################################################################################################
+#
+# A local, multi-core backend for the word counts in count_words.py, with no Spark at all.
+#
+# For a file the size of Holmes.txt (600KB) or war.txt (3.3MB), starting up a SparkContext and running a job
+# on it may well cost more than counting the words (how much more, and how big a file has to be before Spark
+# pays off, depends on the machine and the cluster; --benchmark below measures it).  The functions here do the
+# same counts on one machine: every file is cut into byte ranges of about chunkSize bytes, each of which ends
+# right after a newline so that no line is ever split in two, and a multiprocessing pool counts the ranges in
+# parallel.  Each process maps the file into memory with mmap and reads only its own range, so the file is
+# never copied into the pool, and only one Counter per range comes back, to be merged on the driver.
+#
+# method picks which of the Spark functions in count_words.py to reproduce, with the same results:
+#
+# "countWords":  every line is split on single spaces, just as countWords does it
+# "countWords2": the same, but words of one character are dropped, and the rest are lowercased
+# "countWords3": the lines are split with the tokenizer of the Activity scripts (see tokenizer.py), and
+#                words shorter than minLength are dropped... this one tokenizes each range of bytes in one go,
+#                straight from the memory-mapped file
+#
+# Lines are split the way sc.textFile splits them (at "\n", "\r" or "\r\n"), and decoded as UTF-8.  From the
+# command line, for example:
+#
+# python local_word_count.py Holmes.txt war.txt --method countWords2 --top 20
+#
+# prints the 20 most common words, and
+#
+# python local_word_count.py Holmes.txt war.txt --benchmark
+#
+# times this backend against Spark (a local[*] SparkContext, if pyspark is installed) on ever bigger copies
+# of the input, to find out how big the input has to be, on this machine, before Spark is the faster of the
+# two.
+#
+#####################################################################################################################
+
+import os
+import mmap
+import time
+import heapq
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+from tokenizer import tokenize, tokenizeBytes
+
+methods = ["countWords", "countWords2", "countWords3"]
+
+# this returns the words of one line of text, exactly the way the given method of count_words.py finds them
+def wordsOfLine (line, method, minLength=2):
+        if method == "countWords":
+                return line.split (" ")
+        if method == "countWords2":
+                return [word.lower () for word in line.split (" ") if len (word) > 1]
+        return [word for word in tokenize (line) if len (word) >= minLength]
+
+# this returns the names of the files to count: the files themselves, and every file inside a directory
+def listFiles (fileNames):
+        returnVal = []
+        for fileName in fileNames:
+                if os.path.isdir (fileName):
+                        returnVal.extend (sorted (os.path.join (fileName, x) for x in os.listdir (fileName) if os.path.isfile (os.path.join (fileName, x))))
+                else:
+                        returnVal.append (fileName)
+        return returnVal
+
+# this cuts a file into (fileName, start, end) byte ranges of about chunkSize bytes, each of which ends right
+# after a newline (or at the end of the file)
+def splitRanges (fileName, chunkSize):
+        size = os.path.getsize (fileName)
+        if size == 0:
+                return []
+        ranges, start = [], 0
+        with open (fileName, "rb") as f, mmap.mmap (f.fileno (), 0, access=mmap.ACCESS_READ) as data:
+                while start < size:
+                        end = data.find (b"\n", min (start + chunkSize, size) - 1)
+                        end = size if end < 0 else end + 1
+                        ranges.append ((fileName, start, end))
+                        start = end
+        return ranges
+
+# this counts the words in one byte range of a file, in one of the processes of the pool
+def countRange (task):
+        fileName, start, end, method, minLength = task
+        counts = Counter ()
+        with open (fileName, "rb") as f, mmap.mmap (f.fileno (), 0, access=mmap.ACCESS_READ) as data:
+                if method == "countWords3":
+                        counts.update (word for word in tokenizeBytes (data[start:end]) if len (word) >= minLength)
+                        return counts
+                for line in data[start:end].splitlines ():
+                        counts.update (wordsOfLine (line.decode ("utf-8", errors="replace"), method, minLength))
+        return counts
+
+# this counts the words in all of the given files (or directories) with numProcesses processes (one per core
+# by default), and returns the numWords most common ones as a list of ("word", count) pairs, just like the
+# functions in count_words.py; numWords=None returns the whole Counter instead
+def countWordsLocal (fileNames, numWords=200, method="countWords", minLength=2, numProcesses=None, chunkSize=1 << 22):
+        if method not in methods:
+                raise ValueError ("method has to be one of %s, but got %r" % (", ".join (methods), method))
+        tasks = [x + (method, minLength) for fileName in listFiles (fileNames) for x in splitRanges (fileName, chunkSize)]
+        counts = Counter ()
+        if len (tasks) <= 1 or numProcesses == 1:
+                for task in tasks:
+                        counts.update (countRange (task))
+        else:
+                with multiprocessing.Pool (min (numProcesses or os.cpu_count (), len (tasks))) as pool:
+                        for partial in pool.imap_unordered (countRange, tasks):
+                                counts.update (partial)
+        if numWords is None:
+                return counts
+        return heapq.nlargest (numWords, counts.items (), key=lambda p : p[1])
+
+#####################################################################################################################
+#
+# The benchmark against Spark.
+#
+#####################################################################################################################
+
+# this is the same job as the function of count_words.py that method names, on a SparkContext
+def countWordsSpark (sc, fileName, numWords=200, method="countWords", minLength=2):
+        words = sc.textFile (fileName).flatMap (lambda line: wordsOfLine (line, method, minLength))
+        aggregatedCounts = words.map (lambda word: (word, 1)).reduceByKey (lambda a, b: a + b)
+        return aggregatedCounts.top (numWords, key=lambda p : p[1])
+
+# this writes copies of the input files, concatenated over and over, of about each of the given sizes in MB,
+# and times the local backend and Spark on each of them
+def runBenchmark (fileNames, sizes, method="countWords", numProcesses=None):
+        texts = []
+        for fileName in listFiles (fileNames):
+                with open (fileName, "rb") as f:
+                        texts.append (f.read ())
+        text = b"".join (texts)
+        try:
+                from pyspark import SparkContext
+                start = time.time ()
+                sc = SparkContext ("local[*]", "local_word_count")
+                print ("SparkContext started in %.2fs" % (time.time () - start))
+        except ImportError:
+                sc = None
+                print ("pyspark is not installed, so only the local backend is timed")
+        print ("%10s %12s %12s" % ("MB", "local", "spark"))
+        crossover = None
+        with tempfile.TemporaryDirectory () as directory:
+                for size in sizes:
+                        fileName = os.path.join (directory, "input%d.txt" % size)
+                        with open (fileName, "wb") as f:
+                                for i in range (max (1, int (round (size * 1e6 / len (text))))):
+                                        f.write (text)
+                        start = time.time ()
+                        localResult = countWordsLocal ([fileName], method=method, numProcesses=numProcesses)
+                        localTime = time.time () - start
+                        if sc is None:
+                                print ("%10d %11.2fs %12s" % (size, localTime, "-"))
+                                continue
+                        start = time.time ()
+                        sparkResult = countWordsSpark (sc, fileName, method=method)
+                        sparkTime = time.time () - start
+                        if sorted (x[1] for x in localResult) != sorted (x[1] for x in sparkResult):
+                                print ("the counts of the local backend and Spark differ at %dMB" % size)
+                        print ("%10d %11.2fs %11.2fs" % (size, localTime, sparkTime))
+                        if crossover is None and sparkTime < localTime:
+                                crossover = size
+        if sc is not None:
+                sc.stop ()
+                if crossover is None:
+                        print ("the local backend was faster at every size")
+                else:
+                        print ("Spark was faster from %dMB on, not counting the time to start it" % crossover)
+
+if __name__ == "__main__":
+        parser = argparse.ArgumentParser (description="Count the most common words in text files on this machine, without Spark.")
+        parser.add_argument ("fileNames", nargs="+", help="the text files (or directories of them) to count")
+        parser.add_argument ("--method", choices=methods, default="countWords", help="which function of count_words.py to reproduce")
+        parser.add_argument ("--top", type=int, default=200, help="how many of the most common words to print")
+        parser.add_argument ("--min-length", type=int, default=2, help="the shortest word that countWords3 counts")
+        parser.add_argument ("--processes", type=int, default=None, help="the number of processes (one per core by default)")
+        parser.add_argument ("--benchmark", action="store_true", help="time this against Spark on ever bigger copies of the input instead")
+        parser.add_argument ("--sizes", type=int, nargs="+", default=[1, 4, 16, 64, 256, 1024], help="the sizes, in MB, to benchmark")
+        args = parser.parse_args ()
+        if args.benchmark:
+                runBenchmark (args.fileNames, args.sizes, method=args.method, numProcesses=args.processes)
+        else:
+                for word, count in countWordsLocal (args.fileNames, numWords=args.top, method=args.method, minLength=args.min_length, numProcesses=args.processes):
+                        print ("%s\t%d" % (word, count))
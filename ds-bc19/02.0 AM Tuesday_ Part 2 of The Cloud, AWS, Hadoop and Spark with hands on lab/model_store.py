@@ -0,0 +1,147 @@
+
+#####################################################################################################################
+#
+# Saving and loading the trained 20 newsgroups models.
+#
+# Every Activity script rebuilds topWords, idfArray, mappingMatrix, gramMatrix / invGram and regressionParams from
+# the raw text on every run, and nothing is ever written out.  The functions here save those artifacts (and the
+# local engines from local_engine.py) into a directory: the vocabulary goes into a plain "word<TAB>count" text
+# file with one line per dictionary position, and every array goes into its own .npy file.  Arrays are loaded
+# back memory-mapped, so a prediction process starts in milliseconds no matter how big the 20,000 by 1000
+# mappingMatrix is, and several processes that load the same directory all share one physical copy of it
+# through the operating system's page cache.  For example, at the end of Activity11.py:
+#
+# saveArtifacts ("newsgroupModel", topWords, idfArray=idfArray, mappingMatrix=mappingMatrix, regressionParams=regressionParams)
+# saveRegressionEngine (localEngine, "newsgroupModel/engine")
+#
+# (the engine directory only holds the dictionary, regressionParams and the folded termWeights, so the big
+# arrays are not written twice) and then, in any other python process:
+#
+# localEngine = loadRegressionEngine ("newsgroupModel/engine")
+# localEngine.getPrediction ("god jesus allah")
+#
+#####################################################################################################################
+
+import os
+import numpy as np
+from local_engine import KnnEngine, RegressionEngine, NewsgroupEngine
+
+# this writes topWords, a list of ("word", count) pairs, to vocabulary.txt in the given directory... the
+# line number of each word is its position in the dictionary
+def saveVocabulary (directory, topWords):
+        os.makedirs (directory, exist_ok=True)
+        with open (os.path.join (directory, "vocabulary.txt"), "w") as f:
+                for word, count in topWords:
+                        f.write ("%s\t%d\n" % (word, count))
+
+# and this reads it back in as a list of ("word", count) pairs
+def loadVocabulary (directory):
+        with open (os.path.join (directory, "vocabulary.txt")) as f:
+                return [(x[0], int (x[1])) for x in (line.rstrip ("\n").split ("\t") for line in f)]
+
+# this writes a list of strings (such as docIDs or newsgroup names) to a text file, one per line
+def saveLines (fileName, lines):
+        with open (fileName, "w") as f:
+                for line in lines:
+                        f.write ("%s\n" % line)
+
+def loadLines (fileName):
+        with open (fileName) as f:
+                return [line.rstrip ("\n") for line in f]
+
+# this saves each of the given arrays as name.npy in the given directory; arrays that are None are skipped
+def saveArrays (directory, **arrays):
+        os.makedirs (directory, exist_ok=True)
+        for name, array in arrays.items ():
+                if array is not None:
+                        np.save (os.path.join (directory, name + ".npy"), np.ascontiguousarray (array))
+
+# and this loads one of them back, memory-mapped read-only by default, so that nothing is actually read
+# from disk until it is used; it returns None if the array was never saved
+def loadArray (directory, name, mmapMode="r"):
+        fileName = os.path.join (directory, name + ".npy")
+        if not os.path.exists (fileName):
+                return None
+        return np.load (fileName, mmap_mode=mmapMode)
+
+#####################################################################################################################
+#
+# The training artifacts of the Activity scripts.
+#
+#####################################################################################################################
+
+# this saves the dictionary along with any of the arrays built by the Activity scripts.  dfArray, numDocs,
+# gramMatrix and xTransposeY are everything that an IncrementalModel (see incremental_model.py) needs to
+# carry on from where the script stopped
+def saveArtifacts (directory, topWords, idfArray=None, mappingMatrix=None, gramMatrix=None, invGram=None, regressionParams=None, newsgroupParams=None,
+                dfArray=None, numDocs=None, xTransposeY=None):
+        saveVocabulary (directory, topWords)
+        saveArrays (directory, idfArray=idfArray, mappingMatrix=mappingMatrix, gramMatrix=gramMatrix, invGram=invGram, regressionParams=regressionParams, newsgroupParams=newsgroupParams,
+                dfArray=dfArray, numDocs=None if numDocs is None else np.array ([numDocs]), xTransposeY=xTransposeY)
+
+# and this loads them all back into a dictionary keyed by the same names as in the Activity scripts; the
+# arrays are memory-mapped, and any that were never saved come back as None
+def loadArtifacts (directory, mmapMode="r"):
+        returnVal = {"topWords": loadVocabulary (directory)}
+        for name in ["idfArray", "mappingMatrix", "gramMatrix", "invGram", "regressionParams", "newsgroupParams", "dfArray", "xTransposeY"]:
+                returnVal[name] = loadArray (directory, name, mmapMode)
+        numDocs = loadArray (directory, "numDocs", None)
+        returnVal["numDocs"] = None if numDocs is None else float (numDocs[0])
+        return returnVal
+
+#####################################################################################################################
+#
+# The local engines.  Loading one does not rebuild anything: the arrays that the engine answers queries from
+# are memory-mapped straight back into place.
+#
+#####################################################################################################################
+
+def saveKnnEngine (engine, directory):
+        saveVocabulary (directory, [(word, 0) for word in sorted (engine.dictionaryLookup, key=engine.dictionaryLookup.get)])
+        saveArrays (directory, useTF=np.array (engine.useTF), idfArray=engine.idfArray, docLabels=engine.docLabels,
+                postingDocs=engine.postingDocs, postingValues=engine.postingValues, postingStarts=engine.postingStarts,
+                docIndices=engine.docIndices, docValues=engine.docValues, docStarts=engine.docStarts)
+        saveLines (os.path.join (directory, "docIDs.txt"), engine.docIDs)
+        saveLines (os.path.join (directory, "labelNames.txt"), engine.labelNames)
+
+def loadKnnEngine (directory, mmapMode="r"):
+        engine = KnnEngine.__new__ (KnnEngine)
+        engine.dictionaryLookup = dict ((x[0], i) for i, x in enumerate (loadVocabulary (directory)))
+        engine.useTF = bool (loadArray (directory, "useTF", None))
+        engine.idfArray = loadArray (directory, "idfArray", mmapMode)
+        engine.docIDs = loadLines (os.path.join (directory, "docIDs.txt"))
+        engine.labelNames = np.array (loadLines (os.path.join (directory, "labelNames.txt")))
+        for name in ["docLabels", "postingDocs", "postingValues", "postingStarts", "docIndices", "docValues", "docStarts"]:
+                setattr (engine, name, loadArray (directory, name, mmapMode))
+        # the approximate search index is not saved; call engine.buildLshIndex () again to get it back
+        engine.lshIndex = None
+        return engine
+
+# the linear engines answer every query from termWeights alone, so idfArray and mappingMatrix (which is
+# 160MB for 20,000 words by 1000 dimensions) are not saved with them... they are already in the directory
+# of saveArtifacts, and a loaded engine has them as None
+def saveRegressionEngine (engine, directory):
+        saveVocabulary (directory, [(word, 0) for word in sorted (engine.dictionaryLookup, key=engine.dictionaryLookup.get)])
+        saveArrays (directory, regressionParams=engine.regressionParams, termWeights=engine.termWeights)
+
+def loadRegressionEngine (directory, mmapMode="r"):
+        engine = RegressionEngine.__new__ (RegressionEngine)
+        engine.dictionaryLookup = dict ((x[0], i) for i, x in enumerate (loadVocabulary (directory)))
+        engine.idfArray, engine.mappingMatrix = None, None
+        for name in ["regressionParams", "termWeights"]:
+                setattr (engine, name, loadArray (directory, name, mmapMode))
+        return engine
+
+def saveNewsgroupEngine (engine, directory):
+        saveVocabulary (directory, [(word, 0) for word in sorted (engine.dictionaryLookup, key=engine.dictionaryLookup.get)])
+        saveArrays (directory, newsgroupParams=engine.newsgroupParams, termWeights=engine.termWeights)
+        saveLines (os.path.join (directory, "newsgroupNames.txt"), engine.newsgroupNames)
+
+def loadNewsgroupEngine (directory, mmapMode="r"):
+        engine = NewsgroupEngine.__new__ (NewsgroupEngine)
+        engine.dictionaryLookup = dict ((x[0], i) for i, x in enumerate (loadVocabulary (directory)))
+        engine.idfArray, engine.mappingMatrix = None, None
+        for name in ["newsgroupParams", "termWeights"]:
+                setattr (engine, name, loadArray (directory, name, mmapMode))
+        engine.newsgroupNames = np.array (loadLines (os.path.join (directory, "newsgroupNames.txt")))
+        return engine
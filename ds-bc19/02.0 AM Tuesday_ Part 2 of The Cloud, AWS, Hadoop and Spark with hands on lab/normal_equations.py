@@ -0,0 +1,87 @@
+
+#####################################################################################################################
+#
+# Building the Gram matrix of the 1000-dimensional document vectors, X^T X, where X has one row per document.
+#
+# Written as the sum of np.outer (x, x) over all of the rows, this costs an 8MB, 1000 by 1000 temporary for
+# every single document.  Here each partition instead stacks blockSize of its rows at a time into a
+# (blockSize, 1000) matrix X and adds np.dot (X.T, X) to one running total... numpy hands a product of a
+# matrix with its own transpose to the BLAS syrk routine, so this is one cache-friendly call per block, and
+# each partition only ever holds one block and one 1000 by 1000 partial sum.  Those partials, one per
+# partition, are then added up on the driver, or in a tree on the workers if treeDepth is given.
+#
+# For the regression, X^T y (where y holds the +1 / -1 label of each document) is built in the very same
+# pass, and the normal equations (X^T X + ridge * I) w = X^T y are then solved once, on the driver, with a
+# Cholesky factorization or lstsq, rather than by explicitly inverting X^T X.  y can also be a matrix Y with
+# numTargets columns, one per target (say, one per newsgroup), in which case X^T Y is built in that same pass,
+# and all of the columns of the solution come out of a single factorization of X^T X.
+#
+#####################################################################################################################
+
+import numpy as np
+
+# this takes an iterator over (key, vector) pairs and yields them blockSize at a time, as a list of keys and
+# a matrix with one row per vector
+def stackRows (rows, blockSize):
+        keys, vectors = [], []
+        for key, vector in rows:
+                keys.append (key)
+                vectors.append (vector)
+                if len (vectors) == blockSize:
+                        yield keys, np.vstack (vectors)
+                        keys, vectors = [], []
+        if len (vectors) > 0:
+                yield keys, np.vstack (vectors)
+
+# this returns X^T X for the (key, vector) pairs in one partition, inside a list so that it can be used
+# directly with mapPartitions
+def gramOfPartition (rows, dimension, blockSize=1024):
+        gram = np.zeros ((dimension, dimension))
+        for keys, block in stackRows (rows, blockSize):
+                gram += np.dot (block.T, block)
+        return [gram]
+
+# and this returns X^T X for a whole RDD of (key, vector) pairs, where every vector has the given dimension
+def computeGramMatrix (rdd, dimension, blockSize=1024, treeDepth=None):
+        partials = rdd.mapPartitions (lambda x: gramOfPartition (x, dimension, blockSize))
+        if treeDepth is None:
+                return partials.reduce (np.add)
+        return partials.treeReduce (np.add, depth=treeDepth)
+
+# this returns (X^T X, X^T y) for the (key, vector) pairs in one partition, inside a list, where labelOf maps
+# the key of each pair to its entry of y... or, if numTargets is given, to its row of Y, an array of
+# numTargets entries, in which case X^T Y is a (dimension, numTargets) matrix
+def normalEquationsOfPartition (rows, dimension, labelOf, blockSize=1024, numTargets=None):
+        gram = np.zeros ((dimension, dimension))
+        xty = np.zeros (dimension if numTargets is None else (dimension, numTargets))
+        for keys, block in stackRows (rows, blockSize):
+                gram += np.dot (block.T, block)
+                xty += np.dot (block.T, np.array ([labelOf (key) for key in keys], dtype=np.float64))
+        return [(gram, xty)]
+
+# and this returns (X^T X, X^T y) for a whole RDD of (key, vector) pairs, in a single pass over it
+def computeNormalEquations (rdd, dimension, labelOf, blockSize=1024, treeDepth=None, numTargets=None):
+        partials = rdd.mapPartitions (lambda x: normalEquationsOfPartition (x, dimension, labelOf, blockSize, numTargets))
+        addPartials = lambda x1, x2: (np.add (x1[0], x2[0]), np.add (x1[1], x2[1]))
+        if treeDepth is None:
+                return partials.reduce (addPartials)
+        return partials.treeReduce (addPartials, depth=treeDepth)
+
+# this solves (gram + ridge * I) w = xty for w, which is a matrix with one column per target if xty is one.
+# With method="cholesky" the matrix is first checked to be positive definite by trying to factor it as L L^T,
+# and then w comes from a single solve, which is fast and stable for such a matrix (numpy has no solver that
+# takes L itself, and a solve against each of L and L^T would cost more than the single one).  If it is not
+# positive definite (no ridge, and fewer documents than dimensions, say), the solve would not fail, but just
+# return a huge w, so this falls back to lstsq instead, which method="lstsq" always uses, and which returns
+# the minimum norm solution of a singular system
+def solveNormalEquations (gram, xty, ridge=0.0, method="cholesky"):
+        if method not in ["cholesky", "lstsq"]:
+                raise ValueError ("method has to be \"cholesky\" or \"lstsq\", but got %r" % (method,))
+        matrix = gram + ridge * np.eye (len (gram))
+        if method == "cholesky":
+                try:
+                        np.linalg.cholesky (matrix)
+                        return np.linalg.solve (matrix, xty)
+                except np.linalg.LinAlgError:
+                        pass
+        return np.linalg.lstsq (matrix, xty, rcond=None)[0]
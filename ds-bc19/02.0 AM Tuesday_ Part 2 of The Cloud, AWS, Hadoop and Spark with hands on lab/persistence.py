@@ -0,0 +1,82 @@
+
+#####################################################################################################################
+#
+# A persistence plan for the datasets that the Activity scripts read more than once.
+#
+# Spark does not keep the result of a transformation around unless it is told to, so every action (a top, an
+# aggregate, a reduce) replays the whole lineage behind it, all the way back to the text file.  A
+# PersistencePlan is given a storage level for each of the reused datasets, by name, for example
+#
+# persistencePlan = PersistencePlan (sc, {"keyAndTokenIDs": StorageLevel.MEMORY_AND_DISK,
+#                                         "allDocsAsLowerDimNumpyArrays": StorageLevel.MEMORY_ONLY})
+#
+# and the script then wraps each of those datasets in persistencePlan.persist ("name", rdd) as it builds it,
+# calls persistencePlan.report ("what just ran") after each action to log, for every dataset, whether that
+# action had to compute it or found it in the cache, and calls persistencePlan.release ("name") once nothing
+# downstream needs the dataset any more.  A dataset whose level is None (or that is not in the plan at all)
+# is not persisted, but it is still tracked, so the log shows how often it gets recomputed.
+#
+# Note that in Python every record that Spark caches is pickled, so MEMORY_ONLY and MEMORY_AND_DISK already
+# store serialized data; the choice is really between memory only (evicted partitions are recomputed),
+# memory spilling to disk, and DISK_ONLY.
+#
+#####################################################################################################################
+
+class PersistencePlan:
+        #
+        # sc is the SparkContext; storageLevels maps the name of each dataset to its StorageLevel (or None),
+        # and log is called with every message
+        def __init__ (self, sc, storageLevels, log=print):
+                self.sc = sc
+                self.storageLevels = dict (storageLevels)
+                self.log = log
+                self.stages = {}
+                self.counters = {}
+                self.reported = {}
+
+        # this persists rdd at the storage level that the plan gives to name, and returns the dataset that the
+        # rest of the script should build on.  Two accumulators are bumped along the way: one for every
+        # partition that is actually computed, and one for every partition that is read by a later stage,
+        # whether it was computed for that read or came out of the cache; report compares the two
+        def persist (self, name, rdd):
+                computed = self.sc.accumulator (0)
+                read = self.sc.accumulator (0)
+                def countComputed (iterator):
+                        computed.add (1)
+                        return iterator
+                def countRead (iterator):
+                        read.add (1)
+                        return iterator
+                rdd = rdd.mapPartitions (countComputed, preservesPartitioning=True).setName (name)
+                if self.storageLevels.get (name) is not None:
+                        rdd.persist (self.storageLevels[name])
+                self.stages[name] = rdd
+                self.counters[name] = (computed, read)
+                self.reported[name] = (0, 0)
+                return rdd.mapPartitions (countRead, preservesPartitioning=True)
+
+        # this logs, for each dataset still in the plan that the last action read, whether it came from the
+        # cache or had to be computed (again)
+        def report (self, action):
+                for name in self.stages:
+                        computed, read = [x.value for x in self.counters[name]]
+                        newlyComputed, newlyRead = computed - self.reported[name][0], read - self.reported[name][1]
+                        self.reported[name] = (computed, read)
+                        if newlyRead == 0:
+                                continue
+                        elif newlyComputed == 0:
+                                self.log ("%s: read all %d partitions of %s from the cache" % (action, newlyRead, name))
+                        elif newlyComputed == computed:
+                                self.log ("%s: computed %s (%d partitions)%s" % (action, name, newlyComputed, ", now cached" if self.storageLevels.get (name) is not None else ""))
+                        else:
+                                self.log ("%s: recomputed %d of the %d partitions of %s that it read" % (action, newlyComputed, newlyRead, name))
+
+        # this drops the cached copy of a dataset, once nothing downstream is going to read it again
+        def release (self, name):
+                if name in self.stages:
+                        self.stages.pop (name).unpersist ()
+                        self.log ("released %s" % name)
+
+        def releaseAll (self):
+                for name in list (self.stages):
+                        self.release (name)
@@ -0,0 +1,90 @@
+
+#####################################################################################################################
+#
+# Benchmark of the random projections in projections.py against the dense np.random.randn mappingMatrix.
+#
+# This runs on a single machine, without Spark: it cuts the text files into documents of wordsPerDoc words,
+# builds the same sparse tf * idf vectors over the 20,000 most common words as the Activity scripts, and then
+# maps them all down to 1000 dimensions with each kind of projection.  For each one it reports how long the
+# matrix takes to generate, how many bytes have to be shipped to a worker (the pickled matrix or the
+# pickled RandomProjection), how many documents per second are projected, and how well the projection keeps
+# the geometry of the tf * idf space: the mean relative error of the squared lengths, and the mean error of
+# the cosine similarities of random pairs of documents.  Run it with, for example:
+#
+# python projection_benchmark.py Holmes.txt war.txt
+#
+#####################################################################################################################
+
+import sys
+import time
+import pickle
+import numpy as np
+from projections import RandomProjection
+from tokenizer import tokenize
+
+# this returns the sparse (indices, values) tf * idf vectors of all of the documents in the text files
+def buildDocuments (fileNames, wordsPerDoc=200, numWords=20000):
+        words = []
+        for fileName in fileNames:
+                with open (fileName, encoding="utf-8", errors="replace") as f:
+                        words.extend (tokenize (f.read ()))
+        docs = [words[i:i + wordsPerDoc] for i in range (0, len (words), wordsPerDoc)]
+        vocabulary, counts = np.unique (words, return_counts=True)
+        topWords = vocabulary[np.argsort (-counts, kind="stable")[:numWords]]
+        dictionaryLookup = dict ((word, i) for i, word in enumerate (topWords))
+        sparseArrays = []
+        for doc in docs:
+                indices, counts = np.unique (np.array ([dictionaryLookup[j] for j in doc if j in dictionaryLookup], dtype=np.int32), return_counts=True)
+                sparseArrays.append ((indices, np.divide (counts, len (doc))))
+        dfArray = np.zeros (numWords)
+        for indices, values in sparseArrays:
+                dfArray[indices] += 1
+        idfArray = np.log (len (docs) / np.maximum (dfArray, 1))
+        return [(indices, values * idfArray[indices]) for indices, values in sparseArrays if len (indices) > 0]
+
+# this returns the mean relative error of the squared lengths, and the mean absolute error of the cosine
+# similarities of numPairs random pairs of documents, after projecting down to numDims dimensions
+def distortion (sparseArrays, projected, numDims, numPairs=20000):
+        generator = np.random.default_rng (0)
+        first = generator.integers (0, len (sparseArrays), numPairs)
+        second = generator.integers (0, len (sparseArrays), numPairs)
+        lengths = np.array ([np.dot (x[1], x[1]) for x in sparseArrays])
+        lengthError = np.mean (np.abs (np.sum (projected * projected, axis=1) / numDims / lengths - 1))
+        cosineError = 0.0
+        for i, j in zip (first, second):
+                common, inI, inJ = np.intersect1d (sparseArrays[i][0], sparseArrays[j][0], assume_unique=True, return_indices=True)
+                exact = np.dot (sparseArrays[i][1][inI], sparseArrays[j][1][inJ]) / np.sqrt (lengths[i] * lengths[j])
+                approximate = np.dot (projected[i], projected[j]) / np.sqrt (np.dot (projected[i], projected[i]) * np.dot (projected[j], projected[j]))
+                cosineError = cosineError + abs (exact - approximate)
+        return lengthError, cosineError / numPairs
+
+def runBenchmark (fileNames, numWords=20000, numDims=1000):
+        sparseArrays = buildDocuments (fileNames, numWords=numWords)
+        print ("%d documents, %.0f distinct words per document on average" % (len (sparseArrays), np.mean ([len (x[0]) for x in sparseArrays])))
+        print ("%-28s %10s %12s %12s %12s %12s" % ("projection", "generate", "shipped", "docs/sec", "length err", "cosine err"))
+        #
+        # the current dense mappingMatrix, which has to be shipped to the workers as it is
+        start = time.time ()
+        mappingMatrix = np.random.randn (numWords, numDims)
+        generateTime = time.time () - start
+        start = time.time ()
+        projected = np.array ([np.dot (x[1], mappingMatrix[x[0]]) for x in sparseArrays])
+        projectTime = time.time () - start
+        print ("%-28s %9.2fs %11.1fMB %12.0f %12.4f %12.4f" % (("np.random.randn", generateTime, len (pickle.dumps (mappingMatrix)) / 1e6, len (sparseArrays) / projectTime) + distortion (sparseArrays, projected, numDims)))
+        #
+        # and the seeded projections, which only ship their seed
+        for name, sparsity, dtype in [("Normal, float64", None, np.float64), ("Normal, float32", None, np.float32),
+                                      ("Achlioptas (s=3), float64", 3, np.float64), ("Achlioptas (s=3), float32", 3, np.float32),
+                                      ("Li (s=sqrt (20000)), float64", "sqrt", np.float64),
+                                      ("Li (s=sqrt (20000)), float32", "sqrt", np.float32)]:
+                projection = RandomProjection (numWords, numDims, 330, sparsity=sparsity, dtype=dtype)
+                start = time.time ()
+                projection.generated ()
+                generateTime = time.time () - start
+                start = time.time ()
+                projected = np.array ([projection.project (x) for x in sparseArrays])
+                projectTime = time.time () - start
+                print ("%-28s %9.2fs %11.1fKB %12.0f %12.4f %12.4f" % ((name, generateTime, len (pickle.dumps (projection)) / 1e3, len (sparseArrays) / projectTime) + distortion (sparseArrays, projected, numDims)))
+
+if __name__ == "__main__":
+        runBenchmark (sys.argv[1:] if len (sys.argv) > 1 else ["Holmes.txt", "war.txt"])
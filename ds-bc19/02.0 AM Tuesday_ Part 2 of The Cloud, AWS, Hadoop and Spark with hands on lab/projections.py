@@ -0,0 +1,102 @@
+
+#####################################################################################################################
+#
+# Seeded random projections from the 20,000 dimensional tf * idf space down to 1000 dimensions.
+#
+# Activity8Answer.py to Activity11.py used to draw mappingMatrix with np.random.randn (20000, 1000), which is a
+# different matrix on every run (so no two trained models are the same) and 160MB that has to be sent out to
+# every worker.  A RandomProjection is built from a seed instead: pickling it only sends the seed and the
+# shape, and every Python worker regenerates exactly the same matrix from the seed the first time that it
+# needs it, and then keeps it for the rest of the job.  There are two kinds of projection:
+#
+# sparsity=None: every entry is sampled from a Normal (0, 1) distribution, just like np.random.randn.
+#
+# sparsity=s: every entry is +sqrt (s) with probability 1 / 2s, -sqrt (s) with probability 1 / 2s, and zero
+#             otherwise; s=3 is the sparse projection of Achlioptas, and s="sqrt", which uses the square root
+#             of the number of words, is the very sparse projection of Li, Hastie and Church.  The entries
+#             still have mean zero and variance one, so distances and inner products come out on the same
+#             scale as with the Normal matrix, but each row only has about 1000 / s non-zero entries.  When
+#             that is few enough (s of at least denseBelow), they are stored (and used) as a list of columns
+#             and signs rather than as a dense matrix.
+#
+# dtype=np.float32 halves the memory that a dense matrix takes on every worker, and the time to project with
+# it.  projection_benchmark.py compares the accuracy and throughput of the different kinds.
+#
+#####################################################################################################################
+
+import numpy as np
+
+# every matrix that has been generated in this process, keyed by (numWords, numDims, seed, sparsity, dtype)
+generatedMatrices = {}
+
+class RandomProjection:
+        #
+        # this maps numWords dimensional vectors down to numDims dimensions
+        def __init__ (self, numWords, numDims, seed, sparsity=None, dtype=np.float64, blockSize=1000, denseBelow=16):
+                if sparsity == "sqrt":
+                        sparsity = float (np.sqrt (numWords))
+                if sparsity is not None and sparsity < 1:
+                        raise ValueError ("sparsity has to be at least 1, but got %r" % (sparsity,))
+                self.numWords = numWords
+                self.numDims = numDims
+                self.seed = seed
+                self.sparsity = sparsity
+                self.dtype = np.dtype (dtype)
+                self.blockSize = blockSize
+                self.isDense = sparsity is None or sparsity < denseBelow
+
+        def key (self):
+                return (self.numWords, self.numDims, self.seed, self.sparsity, self.dtype.str)
+
+        # this returns the dense matrix, or the (rowStarts, columns, signs) of a sparse one, generating it from
+        # the seed if this process has not done so yet.  The rows are generated blockSize at a time, so that a
+        # sparse matrix never needs a dense numWords by numDims array of random numbers
+        def generated (self):
+                if self.key () not in generatedMatrices:
+                        generator = np.random.default_rng (self.seed)
+                        if self.sparsity is None:
+                                generatedMatrices[self.key ()] = generator.standard_normal ((self.numWords, self.numDims), dtype=self.dtype)
+                        elif self.isDense:
+                                returnVal = np.zeros ((self.numWords, self.numDims), dtype=self.dtype)
+                                for start in range (0, self.numWords, self.blockSize):
+                                        uniform = generator.random ((min (self.blockSize, self.numWords - start), self.numDims))
+                                        block = returnVal[start:start + len (uniform)]
+                                        block[uniform < 1.0 / self.sparsity] = -np.sqrt (self.sparsity)
+                                        block[uniform < 0.5 / self.sparsity] = np.sqrt (self.sparsity)
+                                generatedMatrices[self.key ()] = returnVal
+                        else:
+                                rows, columns, positive = [], [], []
+                                for start in range (0, self.numWords, self.blockSize):
+                                        uniform = generator.random ((min (self.blockSize, self.numWords - start), self.numDims))
+                                        blockRows, blockColumns = np.nonzero (uniform < 1.0 / self.sparsity)
+                                        rows.append (blockRows + start)
+                                        columns.append (blockColumns.astype (np.int32))
+                                        positive.append (uniform[blockRows, blockColumns] < 0.5 / self.sparsity)
+                                rowStarts = np.searchsorted (np.concatenate (rows), np.arange (self.numWords + 1))
+                                signs = np.where (np.concatenate (positive), 1.0, -1.0).astype (self.dtype) * self.dtype.type (np.sqrt (self.sparsity))
+                                generatedMatrices[self.key ()] = (rowStarts, np.concatenate (columns), signs)
+                return generatedMatrices[self.key ()]
+
+        # this returns the whole projection as a dense numWords by numDims matrix, for the code that wants one
+        # (the local engines, or model_store.saveArtifacts)
+        def matrix (self):
+                if self.isDense:
+                        return self.generated ()
+                rowStarts, columns, signs = self.generated ()
+                returnVal = np.zeros ((self.numWords, self.numDims), dtype=self.dtype)
+                returnVal[np.repeat (np.arange (self.numWords), np.diff (rowStarts)), columns] = signs
+                return returnVal
+
+        # this maps a sparse (indices, values) vector down to numDims dimensions.  Only the rows at indices
+        # matter: with a dense matrix, we add up those rows weighted by the values (in the matrix's own
+        # dtype), and with a sparse one, we add each value, times the sign, into the few columns that its row
+        # has a non-zero entry in
+        def project (self, sparseArray):
+                indices, values = sparseArray
+                if self.isDense:
+                        return np.dot (values.astype (self.dtype), self.generated ()[indices]).astype (np.float64)
+                rowStarts, columns, signs = self.generated ()
+                starts = rowStarts[indices]
+                lengths = rowStarts[indices + 1] - starts
+                entries = np.repeat (starts - np.cumsum (lengths) + lengths, lengths) + np.arange (np.sum (lengths))
+                return np.bincount (columns[entries], weights=np.repeat (values, lengths) * signs[entries], minlength=self.numDims)
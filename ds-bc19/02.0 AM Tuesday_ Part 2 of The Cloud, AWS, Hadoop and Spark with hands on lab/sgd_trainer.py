@@ -0,0 +1,185 @@
+
+#####################################################################################################################
+#
+# Mini-batch stochastic gradient descent for the least squares regression of Activity10Answer.py and
+# Activity11.py.
+#
+# The closed form solution in normal_equations.py needs the whole dimension by dimension Gram matrix, on every
+# worker and on the driver, which stops being practical as the projected dimension grows, and it has to be
+# rebuilt from scratch whenever new documents come in.  An SgdTrainer instead only ever holds the current
+# regression parameters w (a vector, or a matrix with one column per target), along with one running sum per
+# parameter.  Each epoch is one single pass over the RDD: every partition gets a copy of the trainer,
+# shuffles its own documents (shuffleSize at a time, so that a partition never has to fit in memory), cuts
+# them into mini-batches of batchSize documents, and steps through them with the gradient of the squared
+# error, X^T (X w - y), of each batch.  Then the parameters of all of the partitions are averaged on the
+# driver, weighted by their number of documents, so only one copy of the parameters per partition ever comes
+# back, and the data can be far bigger than memory (persisted to disk, or not persisted at all).
+#
+# The step is AdaGrad's: each entry of w moves by
+#
+# learningRate (step) * scale * gradient / sqrt (sum of the squares of all of the gradients of that entry so far)
+#
+# so that the entries with small gradients, along the flat directions of a badly conditioned X^T X, move
+# just as fast as the rest, and a batch with a few very long vectors in it cannot blow the parameters up.
+# scale is sqrt (average squared label / average squared length of the vectors), found from the first batch
+# of every partition before the first epoch: a w whose entries are all about that big gives outputs about as
+# big as the labels, so that learningRate does not depend on the scale of the vectors or of the labels;
+# values from 0.1 to 1 are reasonable.  AdaGrad already takes smaller and smaller steps as the sums grow, so
+# the schedule can keep learningRate constant, or decay it further as learningRate / (1 + decay * step)
+# ("inverse") or learningRate / sqrt (1 + decay * step) ("inverseSqrt").  Passing initialParams (say, the
+# regressionParams saved by an earlier run) warm-starts the trainer, so that a model can be updated with a few
+# epochs over just the new documents, rather than retrained from scratch (the sums of squared gradients start
+# off at the size of a typical gradient at w = 0, so the small gradients near a good model only take small
+# steps); partialFit does the same with a batch that is already sitting on the driver (with only a handful of
+# documents per step, a smaller learningRate, such as 0.1, keeps each step from just fitting those few).
+#
+# On a synthetic corpus of about 4000 documents in the format of the newsgroup corpus, 20 epochs with the
+# default settings came within a few percent of the mean squared error and the training accuracy of the
+# closed form solution.
+#
+#####################################################################################################################
+
+import copy
+import itertools
+import numpy as np
+from normal_equations import stackRows
+
+# this returns (X^T (X w - y), sum of squared errors) for a block of vectors X and its labels y
+def gradientOfBlock (block, labels, weights):
+        residuals = np.dot (block, weights) - labels
+        return (np.dot (block.T, residuals), np.sum (residuals * residuals))
+
+# this returns (sum of squared lengths, sum of squared labels, number of rows) for some (key, vector) pairs,
+# inside a list, where labelOf maps the key of each pair to its entry (or row) of y
+def squaredSizes (rows, labelOf):
+        squaredLength, squaredLabels, count = 0.0, 0.0, 0
+        for key, vector in rows:
+                label = np.asarray (labelOf (key), dtype=np.float64)
+                squaredLength += np.dot (vector, vector)
+                squaredLabels += np.sum (label * label)
+                count += 1
+        return [(squaredLength, squaredLabels, count)]
+
+# this adds up the results of two partitions: the parameters and sums of squared gradients, weighted by the
+# number of documents, the squared errors and the numbers of documents, and the most steps taken by any of them
+def addPartitionResults (x1, x2):
+        return (np.add (x1[0], x2[0]), np.add (x1[1], x2[1]), x1[2] + x2[2], x1[3] + x2[3], max (x1[4], x2[4]))
+
+class SgdTrainer:
+        #
+        # labelOf maps the key of a (key, vector) pair to its label, or, if numTargets is given, to an array
+        # of numTargets labels; ridge adds ridge * |w|^2 / numDocs to the average squared error per document
+        def __init__ (self, dimension, labelOf, numTargets=None, batchSize=64, epochs=20, learningRate=0.5,
+                        schedule="constant", decay=0.1, ridge=0.0, initialParams=None, seed=0, treeDepth=2, shuffleSize=10000, log=print):
+                if schedule not in ["constant", "inverse", "inverseSqrt"]:
+                        raise ValueError ("schedule has to be \"constant\", \"inverse\" or \"inverseSqrt\", but got %r" % (schedule,))
+                self.labelOf = labelOf
+                self.batchSize = batchSize
+                self.epochs = epochs
+                self.learningRate = learningRate
+                self.schedule = schedule
+                self.decay = decay
+                self.ridge = ridge
+                self.seed = seed
+                self.treeDepth = treeDepth
+                self.shuffleSize = shuffleSize
+                self.log = log
+                self.numSteps = 0
+                self.numEpochs = 0
+                self.scale = None
+                shape = (dimension,) if numTargets is None else (dimension, numTargets)
+                if initialParams is not None:
+                        self.params = np.array (initialParams, dtype=np.float64)
+                        #
+                        # a single vector of parameters is fine for a single target, but anything else has to
+                        # match the labels exactly, or the first step would broadcast it into nonsense
+                        if numTargets == 1 and self.params.shape == (dimension,):
+                                self.params = self.params.reshape (shape)
+                        if self.params.shape != shape:
+                                raise ValueError ("initialParams has to have shape %r, but got an array of shape %r" % (shape, self.params.shape))
+                else:
+                        self.params = np.zeros (shape)
+                self.squaredGradients = np.zeros (shape)
+
+        # this is the learning rate for the step that is about to be taken
+        def currentLearningRate (self):
+                if self.schedule == "inverse":
+                        return self.learningRate / (1 + self.decay * self.numSteps)
+                if self.schedule == "inverseSqrt":
+                        return self.learningRate / np.sqrt (1 + self.decay * self.numSteps)
+                return self.learningRate
+
+        # this sets scale from the sums that squaredSizes returns, and starts the sums of squared gradients
+        # off at the size of a typical gradient at w = 0, so that a warm-started trainer, whose gradients are
+        # small, also takes small steps, rather than AdaGrad's full-sized first ones
+        def setScale (self, squaredLength, squaredLabels, count):
+                numLabels = count * (1 if self.params.ndim == 1 else self.params.shape[1])
+                if squaredLength == 0 or numLabels == 0:
+                        self.scale = 1.0
+                        return
+                self.scale = float (np.sqrt ((squaredLabels / numLabels) / (squaredLength / count)))
+                self.squaredGradients = self.squaredGradients + (squaredLabels / numLabels) * (squaredLength / count) / len (self.params)
+
+        # this takes one step, given the summed gradient of a batch of count rows; numDocs is the size of the
+        # whole data set, which is what the ridge penalty is spread over
+        def step (self, gradient, count, numDocs):
+                if count == 0:
+                        return
+                gradient = gradient / count + (self.ridge / numDocs) * self.params
+                self.squaredGradients = self.squaredGradients + gradient * gradient
+                stepSize = self.currentLearningRate () * self.scale / (np.sqrt (self.squaredGradients) + 1e-12)
+                self.params = self.params - stepSize * gradient
+                self.numSteps = self.numSteps + 1
+
+        # this runs one epoch over the (key, vector) pairs of partition number index, on a copy of the trainer
+        # (step only ever replaces the arrays, so a shallow copy will do), and returns its result for
+        # addPartitionResults, inside a list
+        def epochOfPartition (self, index, rows, numDocs):
+                self = copy.copy (self)
+                rng = np.random.default_rng ([self.seed, self.numEpochs, index])
+                squaredError, count = 0.0, 0
+                for keys, block in stackRows (rows, self.shuffleSize):
+                        labels = np.array ([self.labelOf (key) for key in keys], dtype=np.float64).reshape ((len (keys),) + self.params.shape[1:])
+                        order = rng.permutation (len (keys))
+                        for start in range (0, len (keys), self.batchSize):
+                                batch = order[start:start + self.batchSize]
+                                gradient, batchError = gradientOfBlock (block[batch], labels[batch], self.params)
+                                self.step (gradient, len (batch), numDocs)
+                                squaredError, count = squaredError + batchError, count + len (batch)
+                return [(count * self.params, count * self.squaredGradients, squaredError, count, self.numSteps)]
+
+        # this trains on an RDD of (key, vector) pairs for the given number of epochs (self.epochs by
+        # default), and logs the mean squared error over each epoch's batches; numDocs is counted if it is
+        # not given
+        def fit (self, rdd, numDocs=None, epochs=None):
+                if numDocs is None:
+                        numDocs = rdd.count ()
+                if self.scale is None:
+                        #
+                        # only the first batch of each partition is read for this
+                        labelOf, batchSize = self.labelOf, self.batchSize
+                        sizes = rdd.mapPartitions (lambda x: squaredSizes (itertools.islice (x, batchSize), labelOf))
+                        self.setScale (*sizes.treeReduce (lambda x1, x2: tuple (a + b for a, b in zip (x1, x2)), depth=self.treeDepth))
+                for epoch in range (self.epochs if epochs is None else epochs):
+                        #
+                        # the trainer goes out to every partition once per epoch, and one set of parameters per
+                        # partition comes back
+                        results = rdd.mapPartitionsWithIndex (lambda index, x: self.epochOfPartition (index, x, numDocs))
+                        params, squaredGradients, squaredError, count, numSteps = results.treeReduce (addPartitionResults, depth=self.treeDepth)
+                        if count > 0:
+                                self.params, self.squaredGradients, self.numSteps = params / count, squaredGradients / count, numSteps
+                        self.numEpochs = self.numEpochs + 1
+                        self.log ("epoch %d: mean squared error %.4f over %d documents, learning rate now %.4f" % (epoch + 1, squaredError / max (count, 1), count, self.currentLearningRate ()))
+                return self.params
+
+        # and this takes one step on a batch of (key, vector) pairs that is already on the driver, for example
+        # a handful of newly labelled documents
+        def partialFit (self, rows, numDocs=None):
+                rows = list (rows)
+                if self.scale is None:
+                        self.setScale (*squaredSizes (rows, self.labelOf)[0])
+                for keys, block in stackRows (rows, max (len (rows), 1)):
+                        labels = np.array ([self.labelOf (key) for key in keys], dtype=np.float64).reshape ((len (keys),) + self.params.shape[1:])
+                        gradient, squaredError = gradientOfBlock (block, labels, self.params)
+                        self.step (gradient, len (keys), len (keys) if numDocs is None else numDocs)
+                return self.params
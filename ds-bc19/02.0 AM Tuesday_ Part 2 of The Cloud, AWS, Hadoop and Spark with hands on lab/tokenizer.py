@@ -0,0 +1,53 @@
+
+#####################################################################################################################
+#
+# The one tokenizer that every script here splits text with, for training and for serving alike.
+#
+# The rule is the one that the Activity scripts have always used, regex.sub (' ', text).lower ().split () with
+# regex = re.compile ('[^a-zA-Z]'): a word is a run of ASCII letters, lowercased, and anything else separates
+# two words.  Rather than running a regular expression and then lower over a whole copy of the text, the text
+# is encoded to ASCII (with every other character turned into "?"), and a single bytes.translate, with a
+# 256-entry table, maps each uppercase letter to its lowercase one and every byte that is not a letter to a
+# space, so that a plain split finds the words.  This gives exactly the same words, about twice as fast on
+# a line and three times as fast on a large block of text, so lines are best tokenized many at a time, with
+# tokenizeLines.  Raw bytes that are UTF-8 (such as a range of a memory-mapped file) can skip the encoding
+# altogether with tokenizeBytes, since every byte of a multi-byte character is a separator anyway.
+#
+# encodeTokens goes one step further and turns a text straight into the dictionary positions of its words,
+# which is what the vectors of both the Spark jobs and the local engines are built from.
+#
+#####################################################################################################################
+
+import numpy as np
+
+# this is the translate table: "A" to "Z" go to "a" to "z", "a" to "z" stay as they are, and every other byte
+# goes to a space
+letterTable = bytes ((x | 32) if (65 <= x <= 90 or 97 <= x <= 122) else 32 for x in range (256))
+
+# this splits bytes (ASCII, or UTF-8) into their lowercase words
+def tokenizeBytes (data):
+        return data.translate (letterTable).decode ("ascii").split ()
+
+# this splits a string into its lowercase words
+def tokenize (textInput):
+        return tokenizeBytes (textInput.encode ("ascii", "replace"))
+
+# this returns all of the words of a sequence of lines, tokenizing batches of about batchSize characters of
+# them at a time... no word can run from one line into the next, so this is the same as tokenizing each line
+def tokenizeLines (lines, batchSize=1 << 20):
+        batch, size = [], 0
+        for line in lines:
+                batch.append (line)
+                size = size + len (line)
+                if size >= batchSize:
+                        yield from tokenize ("\n".join (batch))
+                        batch, size = [], 0
+        if len (batch) > 0:
+                yield from tokenize ("\n".join (batch))
+
+# and this returns the dictionary positions of the words of a string, in order, as an int32 array, dropping
+# every word that is not in the dictionary, where dictionaryLookup maps "mostcommonword" to 0, and so on
+def encodeTokens (textInput, dictionaryLookup):
+        words = tokenize (textInput)
+        positions = np.fromiter ((dictionaryLookup.get (j, -1) for j in words), dtype=np.int32, count=len (words))
+        return positions[positions >= 0]